@@ -0,0 +1,339 @@
+import os
+import re
+import subprocess
+import sys
+import time
+import tracemalloc
+import parser
+from my_ply import yacc
+from my_ply.lex import lex
+from test import casos_de_test
+
+def medir(f, repeticiones=1):
+  inicio = time.perf_counter()
+  for _ in range(repeticiones):
+    f()
+  return (time.perf_counter() - inicio) / repeticiones
+
+def entradas_de_test():
+  # Sin las entradas con errores de sintaxis: los motores que se miden cortan en
+  # el primer error, la recuperación sólo la hace parsear
+  return [test.input for test in casos_de_test if len(parser.parsear(test.input, recuperar=True).errores) == 0]
+
+def tokenizarCon(lexer, contenido):
+  lexer.input(contenido)
+  while lexer.token():
+    pass
+
+def bench_lexer():
+  # Costo por archivo de construir un lexer nuevo contra clonar el prototipo
+  entradas = entradas_de_test()
+  repeticiones = 20
+  def construyendo():
+    for entrada in entradas:
+      tokenizarCon(lex(module=parser), entrada)
+  def clonando():
+    for entrada in entradas:
+      tokenizarCon(parser.nuevoLexer(), entrada)
+  t_lex = medir(construyendo, repeticiones) / len(entradas)
+  t_clone = medir(clonando, repeticiones) / len(entradas)
+  print(f"lex() por archivo:   {t_lex*1e6:10.1f} us")
+  print(f"clone() por archivo: {t_clone*1e6:10.1f} us")
+  print(f"Ahorro por archivo:  {(t_lex-t_clone)*1e6:10.1f} us ({t_lex/t_clone:.1f}x)")
+
+def arranqueEnFrio(codigo, repeticiones=5):
+  # Cada medición es un intérprete nuevo, como un job de corta vida. Se permite
+  # cachear el bytecode: sin él, compilar parsetab.py domina el arranque.
+  comando = [sys.executable, '-c', codigo]
+  entorno = {k: v for k, v in os.environ.items() if k != 'PYTHONDONTWRITEBYTECODE'}
+  return min(medir(lambda: subprocess.run(comando, env=entorno, check=True)) for _ in range(repeticiones))
+
+def bench_arranque():
+  # Intérprete + import de parser.py + parser listo para usar
+  parser.warm_up() # Asegura que parsetab.py esté generado
+  t_base = arranqueEnFrio("import parser")
+  t_pickle = arranqueEnFrio("import parser; from my_ply.yacc import yacc; yacc(module=parser)")
+  t_tabmodule = arranqueEnFrio("import parser; parser.warm_up()")
+  t_congelado = arranqueEnFrio("from parsetab import parser")
+  print(f"Sólo import parser:       {t_base*1e3:8.1f} ms")
+  print(f"Tablas desde pickle:      {(t_pickle-t_base)*1e3:8.1f} ms")
+  print(f"Tablas desde parsetab:    {(t_tabmodule-t_base)*1e3:8.1f} ms")
+  print(f"from parsetab import parser: {(t_congelado-t_base)*1e3:5.1f} ms")
+
+def bench_parser():
+  # Throughput del parser descontando el lexer. Cada entrada de los tests se
+  # parsea por separado, como archivos chicos, para medir el motor LR y no el
+  # costo de armar un único AST gigante.
+  entradas = entradas_de_test()
+  bytes_totales = sum(len(entrada) for entrada in entradas)
+  repeticiones = 40
+  parser.warm_up()
+  def tokenizando():
+    for entrada in entradas:
+      tokenizarCon(parser.nuevoLexer(), entrada)
+  def parseando():
+    for entrada in entradas:
+      parser.parsear(entrada)
+  # El mínimo de varias tandas es más estable que un único promedio
+  t_lexer = min(medir(tokenizando, repeticiones) for _ in range(5))
+  t_parser = min(medir(parseando, repeticiones) for _ in range(5)) - t_lexer
+  print(f"Lexer:  {t_lexer*1e3:8.2f} ms por corpus ({bytes_totales} bytes)")
+  print(f"Parser: {t_parser*1e3:8.2f} ms por corpus ({bytes_totales/1024/t_parser:.1f} KB/s)")
+
+class ContadorDeReducciones:
+  # Logger para el modo debug del parser que sólo cuenta las reducciones
+  def __init__(self):
+    self.reducciones = 0
+  def info(self, mensaje, *args):
+    if mensaje.startswith('Action : Reduce'):
+      self.reducciones += 1
+  def debug(self, mensaje, *args):
+    pass
+  error = debug
+
+def objetosDelMotor(f):
+  # Cuántos objetos del motor LR (YaccSymbol, YaccProduction, YaccValues) se
+  # crean al llamar a f, contando las llamadas a sus __init__. No incluye los
+  # slices de la pila, que no pasan por una función de Python.
+  inits = {clase.__init__.__code__ for clase in (yacc.YaccSymbol, yacc.YaccProduction, yacc.YaccValues)}
+  creados = 0
+  def contar(frame, evento, arg):
+    nonlocal creados
+    if evento == 'call' and frame.f_code in inits:
+      creados += 1
+  sys.setprofile(contar)
+  try:
+    f()
+  finally:
+    sys.setprofile(None)
+  return creados
+
+def bench_reducciones():
+  # Motor general (un YaccSymbol y un slice de la pila por reducción) contra
+  # el de pila de valores que usa parsear
+  entradas = entradas_de_test()
+  p = parser.obtenerParser()
+  contador = ContadorDeReducciones()
+  tokens = 0
+  for entrada in entradas:
+    p.parse(entrada, parser.nuevoLexer(), debug=contador)
+    tokens += len(parser.tokenizar(entrada))
+  repeticiones = 40
+  def general():
+    for entrada in entradas:
+      p.parsedebug(entrada, parser.nuevoLexer())
+  def valores():
+    for entrada in entradas:
+      p.parseopt_notrack(entrada, parser.nuevoLexer())
+  objetos_general = objetosDelMotor(general) / tokens
+  objetos_valores = objetosDelMotor(valores) / tokens
+  # Tandas intercaladas para que el ruido de la máquina afecte a ambos por igual
+  tandas = [(medir(general, repeticiones), medir(valores, repeticiones)) for _ in range(5)]
+  t_general = min(tanda[0] for tanda in tandas)
+  t_valores = min(tanda[1] for tanda in tandas)
+  por_token = contador.reducciones / tokens
+  print(f"Reducciones por token: {por_token:8.1f}")
+  print(f"Objetos del motor por token: general {objetos_general:.2f}, pila de valores {objetos_valores:.2f}")
+  print(f"Motor general:         {t_general*1e3:8.2f} ms por corpus")
+  print(f"Pila de valores:       {t_valores*1e3:8.2f} ms por corpus ({t_general/t_valores:.2f}x)")
+
+def programaGenerado(declaraciones):
+  return ''.join(f"let x{i} = f(y, {i});\n" for i in range(declaraciones))
+
+def picoDeMemoria(f):
+  tracemalloc.start()
+  f()
+  pico = tracemalloc.get_traced_memory()[1]
+  tracemalloc.stop()
+  return pico
+
+def bench_declaraciones():
+  # Archivo entero con parsear contra iter_declaraciones, que entrega cada
+  # declaración del nivel superior apenas se reduce
+  parser.warm_up()
+  for n in [1000, 4000, 16000]:
+    contenido = programaGenerado(n)
+    def completo():
+      parser.parsear(contenido)
+    def primera():
+      next(parser.iter_declaraciones(contenido))
+    def iterando():
+      for _ in parser.iter_declaraciones(contenido):
+        pass
+    t_primera = medir(primera, 10)
+    t_completo = medir(completo)
+    t_iterando = medir(iterando)
+    m_completo = picoDeMemoria(completo)
+    m_iterando = picoDeMemoria(iterando)
+    print(f"{n:6} declaraciones: parsear {t_completo*1e3:8.1f} ms ({m_completo/2**20:6.1f} MB), "
+      + f"iter_declaraciones {t_iterando*1e3:8.1f} ms ({m_iterando/2**20:6.1f} MB), "
+      + f"primera en {t_primera*1e3:6.2f} ms")
+
+def anidado(profundidad):
+  return 'x = ' + 'f(' * profundidad + '1' + ')' * profundidad + ';\n'
+
+def bench_restore():
+  # restore tiene que ser lineal en el tamaño del código, sin importar la profundidad
+  parser.warm_up()
+  casos = [
+    ('plano', programaGenerado(4000)),
+    ('anidado 50', anidado(50) * 100),
+    ('anidado 200', anidado(200) * 25),
+  ]
+  # Además del restore armado desde los nodos: copiando los spans del código
+  # fuente (sólo la raíz, si no se tocó nada) y lo que cuesta asignarlos
+  for nombre, contenido in casos:
+    ast = parser.parsear(contenido)
+    t = min(medir(ast.restore) for _ in range(5))
+    t_fuente = min(medir(lambda: ast.restore(contenido)) for _ in range(5))
+    t_spans = min(medir(lambda: parser.asignarPosiciones(ast)) for _ in range(5))
+    print(f"{nombre:12} {len(contenido)/1024:8.1f} KB: {t*1e3:8.2f} ms ({t*1e6*1024/len(contenido):6.1f} µs/KB)", end='')
+    print(f" | desde la fuente {t_fuente*1e3:8.3f} ms | spans {t_spans*1e3:8.2f} ms")
+
+def bench_profundidad():
+  # Recorridos del AST sobre código anidado 10000 niveles, que con recursión
+  # superaban el límite de Python
+  parser.warm_up()
+  n = 10000
+  casos = [
+    ('invocaciones', anidado(n)),
+    ('listas', 'x = ' + '[' * n + '1' + ']' * n + ';\n'),
+    ('objetos', 'x = ' + '{a: ' * n + '1' + '}' * n + ';\n'),
+    ('cadena', 'x = a' + '.b()' * n + ';\n'),
+    ('callbacks', 'f(() => {\n' * n + 'g();\n' + '});\n' * n),
+  ]
+  for nombre, contenido in casos:
+    inicio = time.perf_counter()
+    ast = parser.parsear(contenido)
+    t_parsear = time.perf_counter() - inicio
+    t_restore = medir(ast.restore)
+    t_show = medir(lambda: parser.show(ast))
+    assert ast.restore() == contenido
+    print(f"{nombre:12} parsear {t_parsear*1e3:8.1f} ms, restore {t_restore*1e3:7.1f} ms, show {t_show*1e3:7.1f} ms")
+
+def memoriaRetenida(f):
+  # Memoria que sigue ocupada después de llamar a f (lo que queda vivo del resultado)
+  tracemalloc.start()
+  resultado = f()
+  memoria = tracemalloc.get_traced_memory()[0]
+  tracemalloc.stop()
+  return resultado, memoria
+
+def memoriaDelAST(contenido):
+  return memoriaRetenida(lambda: parser.parsear(contenido, recuperar=True))
+
+def bench_memoria():
+  # Memoria que ocupa el AST (lo que sigue vivo después de parsear) por byte de código
+  parser.warm_up()
+  casos = [
+    ('tests', entradas_de_test()),
+    ('generado', [programaGenerado(2000)]),
+    ('anidado', [anidado(200) * 20]),
+  ]
+  for nombre, entradas in casos:
+    fuente = 0
+    memoria = 0
+    for entrada in entradas:
+      ast, m = memoriaDelAST(entrada)
+      fuente += len(entrada.encode('utf-8'))
+      memoria += m
+    print(f"{nombre:10} {fuente/1024:8.1f} KB de código: AST de {memoria/1024:9.1f} KB ({memoria/fuente:6.1f} bytes por byte de código)")
+
+def bench_tokens():
+  # Memoria y tiempo por token de la lista de LexToken contra las columnas de
+  # tokenizar_columnar, sobre un programa de casi un MB
+  contenido = programaGenerado(2000) * 20
+  tokens, m_lista = memoriaRetenida(lambda: parser.tokenizar(contenido))
+  columnas, m_columnas = memoriaRetenida(lambda: parser.tokenizar_columnar(contenido))
+  cantidad = len(tokens)
+  assert len(columnas) == cantidad
+  t_lista = medir(lambda: parser.tokenizar(contenido))
+  t_columnas = medir(lambda: parser.tokenizar_columnar(contenido))
+  print(f"{cantidad} tokens en {len(contenido)/2**20:.1f} MB de código")
+  print(f"tokenizar:          {m_lista/cantidad:6.1f} bytes, {t_lista/cantidad*1e6:5.2f} µs por token")
+  print(f"tokenizar_columnar: {m_columnas/cantidad:6.1f} bytes, {t_columnas/cantidad*1e6:5.2f} µs por token")
+
+# Las expresiones regulares que reconocían estos tokens antes de buscar el final con str.find
+expresionesAnteriores = {
+  'comentario': r'/\*([^\*]|\*[^/])*\*/',
+  'línea': r'//[^\n\r]*',
+  'string': r'"([^\\"]|\\"|\\[^"])*"',
+  'template': r'`[^`]*`',
+}
+
+def tokensLargos(n):
+  return [
+    ('comentario', '/*' + ' * licencia, línea larga de texto\n' * (n // 34) + ' */'),
+    ('línea', '//' + 'x' * n),
+    ('string', '"' + 'QUJDREVG\\"R0hJ\\n' * (n // 16) + '"'),
+    ('template', '`' + 'línea ${x}\n' * (n // 11) + '`'),
+  ]
+
+def bench_largos():
+  # Archivos de un único token de varios MB: lo que tarda el lexer en reconocerlo
+  # (sin contar el índice de líneas que arma input()) contra la expresión regular
+  # que lo reconocía antes
+  n = 4 * 2**20
+  print(f"{'':12}{'token()':>10}{'regex':>10}{'input()':>10}  (MB/s)")
+  for nombre, contenido in tokensLargos(n):
+    lexer = parser.nuevoLexer()
+    t_input = medir(lambda: lexer.input(contenido))
+    t_token = medir(lexer.token)
+    lexer.input(contenido)
+    assert lexer.token().value == contenido and lexer.token() is None
+    regex = re.compile(expresionesAnteriores[nombre])
+    t_regex = medir(lambda: regex.match(contenido))
+    mb = len(contenido) / 2**20
+    print(f"{nombre:12}{mb/t_token:10.1f}{mb/t_regex:10.1f}{mb/t_input:10.1f}")
+
+def literalesGrandes(n):
+  return [
+    ('objeto', 'x = {' + ', '.join(f'a{i}: {i}' for i in range(n)) + '};\n'),
+    ('lista', 'x = [' + ', '.join(str(i) for i in range(n)) + '];\n'),
+    ('argumentos', 'f(' + ', '.join(str(i) for i in range(n)) + ');\n'),
+    ('unión', 'type T = ' + ' | '.join(f'A{i}' for i in range(n)) + ';\n'),
+    ('parámetros', 'function f(' + ', '.join(f'a{i}' for i in range(n)) + ') {}\n'),
+    ('clase', 'class C {' + ''.join(f' a{i}: number;' for i in range(n)) + ' }\n'),
+    ('saltos', '\n' * n + 'x;\n'),
+    ('comentarios', ''.join(f'// {i}\n' for i in range(n)) + 'x;\n'),
+  ]
+
+def bench_escala():
+  # Literales con miles de elementos: el tiempo por elemento no tiene que crecer
+  # con el tamaño (armar las listas insertando adelante era cuadrático, y lo
+  # mismo pasaba con las corridas largas de saltos y comentarios)
+  parser.warm_up()
+  tamaños = [5000, 20000, 80000]
+  tiempos = {}
+  for n in tamaños:
+    for nombre, contenido in literalesGrandes(n):
+      tiempos.setdefault(nombre, []).append(medir(lambda: parser.parsear(contenido)) / n)
+  print(f"{'':12}" + ''.join(f"{n:>10}" for n in tamaños) + "  (µs por elemento)")
+  for nombre, por_elemento in tiempos.items():
+    print(f"{nombre:12}" + ''.join(f"{t*1e6:10.1f}" for t in por_elemento))
+
+benchmarks = {
+  'lexer': bench_lexer,
+  'arranque': bench_arranque,
+  'parser': bench_parser,
+  'reducciones': bench_reducciones,
+  'declaraciones': bench_declaraciones,
+  'restore': bench_restore,
+  'profundidad': bench_profundidad,
+  'memoria': bench_memoria,
+  'escala': bench_escala,
+  'tokens': bench_tokens,
+  'largos': bench_largos,
+}
+
+def main():
+  nombres = sys.argv[1:] if len(sys.argv) > 1 else list(benchmarks)
+  for nombre in nombres:
+    if not nombre in benchmarks:
+      print(f"No existe el benchmark {nombre}. Opciones: {', '.join(benchmarks)}")
+      exit(1)
+    print(f"== {nombre} ==")
+    benchmarks[nombre]()
+
+if __name__ == '__main__':
+  main()
\ No newline at end of file
@@ -1,15 +1,30 @@
+import io
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import redirect_stdout
 from bibpy.base import Boom
 from bibpy.archivos import *
 from bibpy.listas import elementosDesde_
-from parser import tokenizar, parsear, mostrarAST, mostrarTokens, mostrarDiff, eq_string
+from parser import tokenizar, parsear, mostrarAST, mostrarTokens, mostrarDiff, eq_string, warm_up, ParseError
 
 testDesde = ''
 
 def main():
-  if len(sys.argv) == 1:
+  argumentos = sys.argv[1:]
+  jobs = 0
+  if '--jobs' in argumentos:
+    i = argumentos.index('--jobs')
+    try:
+      jobs = int(argumentos[i+1]) if i+1 < len(argumentos) else 0
+    except ValueError:
+      jobs = 0
+    if jobs < 1:
+      Boom("--jobs necesita la cantidad de procesos a usar")
+    del argumentos[i:i+2]
+  if len(argumentos) == 0:
     Boom("No me pasaste ninguna ruta a un archivo o carpeta")
-  nombreArchivo = sys.argv[1]
+  nombreArchivo = argumentos[0]
   verb = True
   archivos = [nombreArchivo]
   if existeCarpeta_Acá(nombreArchivo):
@@ -20,26 +35,92 @@ def main():
   for nombreArchivo in archivos:
     if not existeArchivo_Acá(nombreArchivo):
       Boom("No existe el archivo " + nombreArchivo)
-    parsearArchivo(nombreArchivo, verb)
+  if jobs > 0:
+    if not verb:
+      verificarEnParalelo(archivos, jobs)
+      return
+    print("Se ignora --jobs: un solo archivo se parsea en este proceso, mostrando el detalle")
+  for nombreArchivo in archivos:
+    try:
+      parsearArchivo(nombreArchivo, verb)
+    except ParseError as e:
+      # Un archivo que no se puede parsear no frena la verificación del resto
+      if not verb:
+        print(nombreArchivo)
+      print(e)
 
 def parsearArchivo(nombreArchivo, verb=True):
+  # Devuelve el estado del archivo: 'ok', 'error' o 'restauración'
+  estado = 'ok'
   if verb:
     print(nombreArchivo)
   contenido = contenidoDe_(nombreArchivo)
   tokens = tokenizar(contenido)
   # mostrarTokens(tokens)
-  ast = parsear(contenido)
+  ast = parsear(tokens, recuperar=True)
   # mostrarAST(ast)
+  if len(ast.errores) > 0:
+    estado = 'error'
+    if not verb:
+      print(nombreArchivo)
+  for error in ast.errores:
+    print(error)
   z = ast.restore()
   if eq_string(contenido, z):
     if verb:
       print("Restauración exitosa")
   else:
+    estado = 'restauración'
     if not verb:
       print(nombreArchivo)
     print("Falló la restauración")
     mostrarDiff(contenido, z)
-  return ast
+  return estado
+
+def verificarEnParalelo(archivos, jobs):
+  # Cada proceso del pool construye su parser una sola vez (warm_up) y después
+  # verifica todos los archivos que le toquen
+  resultados = []
+  with ProcessPoolExecutor(max_workers=jobs, initializer=warm_up) as pool:
+    pendientes = [pool.submit(verificarArchivo, nombreArchivo) for nombreArchivo in archivos]
+    for pendiente in as_completed(pendientes):
+      resultados.append(pendiente.result())
+  mostrarResumen(resultados)
+
+def verificarArchivo(nombreArchivo):
+  # parsearArchivo sin mostrar el detalle: lo que imprime queda en el detalle
+  # del resultado, que es (archivo, estado, segundos, detalle)
+  inicio = time.perf_counter()
+  salida = io.StringIO()
+  with redirect_stdout(salida):
+    try:
+      estado = parsearArchivo(nombreArchivo, verb=False)
+    except ParseError as e:
+      estado = 'error'
+      print(nombreArchivo)
+      print(e)
+    except Exception as e:
+      estado = 'error'
+      print(nombreArchivo)
+      print(f"{type(e).__name__}: {e}")
+  return (nombreArchivo, estado, time.perf_counter() - inicio, salida.getvalue())
+
+def mostrarResumen(resultados):
+  # Los resultados llegan en el orden en que terminan; el resumen se ordena por
+  # archivo para que dos corridas sobre la misma carpeta sean comparables
+  resultados = sorted(resultados)
+  print("Tiempos por archivo:")
+  for nombreArchivo, estado, segundos, _ in resultados:
+    print(f"{segundos*1e3:10.1f} ms  {estado:13} {nombreArchivo}")
+  for estado, titulo in [('restauración', "Restauraciones fallidas"), ('error', "Errores de parseo")]:
+    fallidos = [resultado for resultado in resultados if resultado[1] == estado]
+    if len(fallidos) > 0:
+      print(f"{titulo} ({len(fallidos)}):")
+      for _, _, _, detalle in fallidos: # El detalle empieza con el nombre del archivo
+        print(detalle.rstrip('\n'))
+  correctos = len([resultado for resultado in resultados if resultado[1] == 'ok'])
+  total = sum(resultado[2] for resultado in resultados)
+  print(f"{correctos} de {len(resultados)} archivos verificados correctamente ({total:.2f} s sumando todos los procesos)")
 
 if __name__ == '__main__':
   main()
\ No newline at end of file
@@ -37,9 +37,16 @@ import re
 import sys
 import types
 import copy
+from array import array
+from bisect import bisect_right
 import os
 import inspect
 
+try:
+    from re import _parser as sre_parse
+except ImportError:                       # Python < 3.11
+    import sre_parse
+
 # This tuple contains acceptable string types
 StringTypes = (str, bytes)
 
@@ -54,7 +61,48 @@ class LexError(Exception):
         self.text = s
 
 # Token class.  This class is used to represent the tokens produced.
+#
+# lineno and colno are not computed while lexing.  The first time they are
+# read they are derived from lexpos and the line-start index of the input
+# (linestarts, see Lexer.input), unless they were set explicitly.  lexer is
+# the Lexer that produced the token, for use in token rules.  endlineno and
+# endlexpos are only set by the parser when tracking, for tokens that take part
+# in error recovery (see YaccSymbol).
 class LexToken(object):
+    __slots__ = ('type', 'value', 'lexpos', 'linestarts', 'lexer', '_lineno', '_colno',
+                 'endlineno', 'endlexpos')
+
+    def __init__(self, type, value, lexpos, linestarts=None, lexer=None):
+        self.type = type
+        self.value = value
+        self.lexpos = lexpos
+        self.linestarts = linestarts
+        self.lexer = lexer
+
+    @property
+    def lineno(self):
+        try:
+            return self._lineno
+        except AttributeError:
+            self._lineno = lineno = bisect_right(self.linestarts, self.lexpos)
+            return lineno
+
+    @lineno.setter
+    def lineno(self, lineno):
+        self._lineno = lineno
+
+    @property
+    def colno(self):
+        try:
+            return self._colno
+        except AttributeError:
+            self._colno = colno = self.lexpos - self.linestarts[self.lineno - 1] + 1
+            return colno
+
+    @colno.setter
+    def colno(self, colno):
+        self._colno = colno
+
     def __repr__(self):
         return f'T({self.type},{self.value!r},{self.lineno},{self.colno},{self.lexpos})'
 
@@ -90,6 +138,9 @@ class PlyLogger(object):
 #    lineno           -  Current line number
 #    lexpos           -  Current position in the input string
 #    colno            -  Current position in the current line
+#
+# lineno and colno are derived from lexpos with the line-start index built by
+# input(), so token rules only need to move lexpos.
 # -----------------------------------------------------------------------------
 
 class Lexer:
@@ -100,6 +151,8 @@ class Lexer:
                                       # mapping regex group numbers to rules
         self.lexretext = None         # Current regular expression strings
         self.lexstatere = {}          # Dictionary mapping lexer states to master regexs
+        self.lexdispatch = None       # Master regexs by first character (see _form_dispatch)
+        self.lexstatedispatch = {}    # Dictionary mapping lexer states to dispatch tables
         self.lexstateretext = {}      # Dictionary mapping lexer states to regex strings
         self.lexstaterenames = {}     # Dictionary mapping lexer states to symbol names
         self.lexstate = 'INITIAL'     # Current lexer state
@@ -118,8 +171,7 @@ class Lexer:
         self.lexignore = ''           # Ignored characters
         self.lexliterals = ''         # Literal characters that can be passed through
         self.lexmodule = None         # Module
-        self.lineno = 1               # Current line number
-        self.colno = 1                # Current column number in the current line
+        self.linestarts = array('l', [0]) # Offset where each line of the input starts
 
     def clone(self, object=None):
         c = copy.copy(self)
@@ -129,8 +181,7 @@ class Lexer:
         # the lexstatere and lexstateerrorf tables.
 
         if object:
-            newtab = {}
-            for key, ritem in self.lexstatere.items():
+            def rebind(ritem):
                 newre = []
                 for cre, findex in ritem:
                     newfindex = []
@@ -139,9 +190,24 @@ class Lexer:
                             newfindex.append(f)
                             continue
                         newfindex.append((getattr(object, f[0].__name__), f[1]))
-                newre.append((cre, newfindex))
-                newtab[key] = newre
+                    newre.append((cre, newfindex))
+                return newre
+
+            newtab = {}
+            for key, ritem in self.lexstatere.items():
+                newtab[key] = rebind(ritem)
             c.lexstatere = newtab
+            newdispatch = {}
+            for key, dispatch in self.lexstatedispatch.items():
+                if dispatch is not None:
+                    rebound = {}      # Characters with the same rules share their entry
+                    for entry in dispatch:
+                        if not isinstance(entry, str) and id(entry) not in rebound:
+                            rebound[id(entry)] = rebind(entry)
+                    dispatch = [rebound.get(id(entry), entry) for entry in dispatch]
+                newdispatch[key] = dispatch
+            c.lexstatedispatch = newdispatch
+            c.lexdispatch = newdispatch.get(c.lexstate)
             c.lexstateerrorf = {}
             for key, ef in self.lexstateerrorf.items():
                 c.lexstateerrorf[key] = getattr(object, ef.__name__)
@@ -155,6 +221,20 @@ class Lexer:
         self.lexdata = s
         self.lexpos = 0
         self.lexlen = len(s)
+        linestarts = array('l', [0])
+        linestarts.extend(m.end() for m in re.finditer('\n', s))
+        self.linestarts = linestarts
+
+    # ------------------------------------------------------------
+    # lineno, colno - Line and column (both from 1) of lexpos
+    # ------------------------------------------------------------
+    @property
+    def lineno(self):
+        return bisect_right(self.linestarts, self.lexpos)
+
+    @property
+    def colno(self):
+        return self.lexpos - self.linestarts[self.lineno - 1] + 1
 
     # ------------------------------------------------------------
     # begin() - Changes the lexing state
@@ -163,6 +243,7 @@ class Lexer:
         if state not in self.lexstatere:
             raise ValueError(f'Undefined state {state!r}')
         self.lexre = self.lexstatere[state]
+        self.lexdispatch = self.lexstatedispatch.get(state)
         self.lexretext = self.lexstateretext[state]
         self.lexignore = self.lexstateignore.get(state, '')
         self.lexerrorf = self.lexstateerrorf.get(state, None)
@@ -193,16 +274,6 @@ class Lexer:
     # ------------------------------------------------------------
     def skip(self, n):
         self.lexpos += n
-        self.colno += n
-
-    def actualizarColNo(self, ini, fin):
-      self.colno = self.siguienteColNo(self.colno, ini, fin)
-
-    def siguienteColNo(self, colno, ini, fin):
-      lastindex = self.lexdata[ini:fin].rfind('\n')
-      if lastindex < 0:
-        return colno + (fin-ini)
-      return len(self.lexdata[ini+lastindex:fin])
 
     # ------------------------------------------------------------
     # token() - Return the next token from the Lexer
@@ -217,118 +288,95 @@ class Lexer:
         lexlen    = self.lexlen
         lexignore = self.lexignore
         lexdata   = self.lexdata
-        colno     = self.colno
+        linestarts = self.linestarts
+        lexdispatch = self.lexdispatch
 
         while lexpos < lexlen:
             # This code provides some short-circuit code for whitespace, tabs, and other ignored characters
             if lexdata[lexpos] in lexignore:
                 lexpos += 1
-                colno += 1
                 continue
 
+            # Only the rules that can start with this character are tried.  For
+            # a one-character token the dispatch table holds its type instead.
+            lexres = self.lexre
+            if lexdispatch is not None:
+                c = ord(lexdata[lexpos])
+                if c < 256:
+                    lexres = lexdispatch[c]
+                    if lexres.__class__ is str:
+                        tok = LexToken(lexres, lexdata[lexpos], lexpos, linestarts, self)
+                        self.lexpos = lexpos + 1
+                        return tok
+
             # Look for a regular expression match
-            for lexre, lexindexfunc in self.lexre:
+            for lexre, lexindexfunc in lexres:
                 m = lexre.match(lexdata, lexpos)
                 if not m:
                     continue
 
                 # Create a token for return
-                tok = LexToken()
-                tok.value = m.group()
-                tok.lineno = self.lineno
-                tok.lexpos = lexpos
-                tok.colno = colno
-
-                i = m.lastindex
-                func, tok.type = lexindexfunc[i]
+                func, toktype = lexindexfunc[m.lastindex]
+                tok = LexToken(toktype, m.group(), lexpos, linestarts, self)
 
-                fin = m.end()
                 if not func:
                     # If no token type was set, it's an ignored token
-                    if tok.type:
-                        self.actualizarColNo(lexpos,fin)
-                        self.lexpos = fin
+                    if toktype:
+                        self.lexpos = m.end()
                         return tok
                     else:
-                        colno = self.siguienteColNo(colno,lexpos,fin)
-                        lexpos = fin
+                        lexpos = m.end()
                         break
 
-                colno = self.siguienteColNo(colno,lexpos,fin)
-                lexpos = fin
+                lexpos = m.end()
 
                 # If token is processed by a function, call it
 
-                tok.lexer = self      # Set additional attributes useful in token rules
                 self.lexmatch = m
                 self.lexpos = lexpos
-                self.colno = colno
                 newtok = func(tok)
-                del tok.lexer
-                del self.lexmatch
 
                 # Every function must return a token, if nothing, we just move to next token
                 if not newtok:
                     lexpos    = self.lexpos         # This is here in case user has updated lexpos.
                     lexignore = self.lexignore      # This is here in case there was a state change
-                    colno     = self.colno
+                    lexdispatch = self.lexdispatch
                     break
                 return newtok
             else:
                 # No match, see if in literals
                 if lexdata[lexpos] in self.lexliterals:
-                    tok = LexToken()
-                    tok.value = lexdata[lexpos]
-                    tok.lineno = self.lineno
-                    tok.type = tok.value
-                    tok.lexpos = lexpos
-                    tok.colno = colno
+                    tok = LexToken(lexdata[lexpos], lexdata[lexpos], lexpos, linestarts, self)
                     self.lexpos = lexpos + 1
-                    self.colno = colno + 1
                     return tok
 
                 # No match. Call t_error() if defined.
                 if self.lexerrorf:
-                    tok = LexToken()
-                    tok.value = self.lexdata[lexpos:]
-                    tok.lineno = self.lineno
-                    tok.type = 'error'
-                    tok.lexer = self
-                    tok.lexpos = lexpos
-                    tok.colno = colno
+                    tok = LexToken('error', lexdata[lexpos:], lexpos, linestarts, self)
                     self.lexpos = lexpos
-                    self.colno = colno
                     newtok = self.lexerrorf(tok)
                     if lexpos == self.lexpos:
                         # Error method didn't change text position at all. This is an error.
                         raise LexError(f"Scanning error. Illegal character {lexdata[lexpos]!r}",
                                        lexdata[lexpos:])
                     lexpos = self.lexpos
-                    colno = self.colno
                     if not newtok:
                         continue
                     return newtok
 
                 self.lexpos = lexpos
-                self.colno = colno
-                raise LexError(f"Illegal character {lexdata[lexpos]!r} at index {lexpos} ({self.lineno}:{colno})",
+                raise LexError(f"Illegal character {lexdata[lexpos]!r} at index {lexpos} ({self.lineno}:{self.colno})",
                                lexdata[lexpos:])
 
         if self.lexeoff:
-            tok = LexToken()
-            tok.type = 'eof'
-            tok.value = ''
-            tok.lineno = self.lineno
-            tok.lexpos = lexpos
-            tok.colno = colno
-            tok.lexer = self
+            tok = LexToken('eof', '', lexpos, linestarts, self)
             self.lexpos = lexpos
-            self.colno = colno
             newtok = self.lexeoff(tok)
             return newtok
 
-        self.lexpos = lexpos + 1
-        self.colno = colno + 1
+        # At the end of the input, not past it, so that lineno and colno
+        # point to where the input ends
+        self.lexpos = min(lexpos, lexlen)
         if self.lexdata is None:
             raise RuntimeError('No input string given with input()')
         return None
@@ -343,6 +391,67 @@ class Lexer:
             raise StopIteration
         return t
 
+# -----------------------------------------------------------------------------
+# ListLexer class
+#
+# Lexer adapter over tokens that were already produced, for example by an
+# earlier pass over the same input.  It offers the token() interface used by
+# the parser, so the input does not need to be lexed a second time.  lineno,
+# colno and lexpos follow the start of the last token handed out, or the end
+# of the last token once there are no more.
+# -----------------------------------------------------------------------------
+
+class ListLexer:
+    def __init__(self, tokens):
+        self.tokens = iter(tokens)
+        self.last = None
+        self.ended = False
+
+    def token(self):
+        tok = next(self.tokens, None)
+        if tok is not None:
+            self.last = tok
+        else:
+            self.ended = True
+        return tok
+
+    @property
+    def lineno(self):
+        if self.last is None:
+            return 1
+        if self.ended:
+            return self.last.lineno + self.last.value.count('\n')
+        return self.last.lineno
+
+    @property
+    def colno(self):
+        if self.last is None:
+            return 1
+        if self.ended:
+            value = self.last.value
+            if '\n' in value:
+                return len(value) - value.rindex('\n')
+            return self.last.colno + len(value)
+        return self.last.colno
+
+    @property
+    def lexpos(self):
+        if self.last is None:
+            return 0
+        if self.ended:
+            return self.last.lexpos + len(self.last.value)
+        return self.last.lexpos
+
+    # Iterator interface
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        t = self.token()
+        if t is None:
+            raise StopIteration
+        return t
+
 # -----------------------------------------------------------------------------
 #                           ==== Lex Builder ===
 #
@@ -407,6 +516,119 @@ def _form_master_re(relist, reflags, ldict, toknames):
         rlist, rre, rnames = _form_master_re(relist[m:], reflags, ldict, toknames)
         return (llist+rlist), (lre+rre), (lnames+rnames)
 
+# -----------------------------------------------------------------------------
+# _form_dispatch()
+#
+# Splits the rules of a lexer state by the characters they can start with.  The
+# result has one entry per character code below 256: the master regexs (as in
+# _form_master_re) with only the rules that can match at that character, in
+# the original order, so the first alternative that matches is the same one.
+# When the first candidate is a string rule for that single character, the
+# entry is the token type, which always wins, and no regex is run.  Characters
+# above 255 use the full master regex.  Returns None when the first characters
+# cannot be worked out (case-insensitive matching).
+# -----------------------------------------------------------------------------
+_ALL_CHARS = frozenset(range(256))
+
+_REPEATS = tuple(getattr(sre_parse, name) for name in ('MAX_REPEAT', 'MIN_REPEAT', 'POSSESSIVE_REPEAT')
+                 if hasattr(sre_parse, name))
+
+_CATEGORIES = {
+    sre_parse.CATEGORY_DIGIT: r'\d', sre_parse.CATEGORY_NOT_DIGIT: r'\D',
+    sre_parse.CATEGORY_SPACE: r'\s', sre_parse.CATEGORY_NOT_SPACE: r'\S',
+    sre_parse.CATEGORY_WORD: r'\w', sre_parse.CATEGORY_NOT_WORD: r'\W',
+}
+
+# Character codes below 256 that a character set ([...]) accepts
+def _set_chars(items, flags):
+    chars = set()
+    negate = False
+    for op, av in items:
+        if op is sre_parse.NEGATE:
+            negate = True
+        elif op is sre_parse.LITERAL:
+            chars.add(av)
+        elif op is sre_parse.RANGE:
+            chars.update(range(av[0], min(av[1], 255) + 1))
+        elif op is sre_parse.CATEGORY and av in _CATEGORIES:
+            category = re.compile(_CATEGORIES[av], flags & re.ASCII)
+            chars.update(c for c in _ALL_CHARS if category.match(chr(c)))
+        else:
+            return _ALL_CHARS
+    return _ALL_CHARS - chars if negate else chars
+
+# First characters (codes below 256) of a parsed regex, and whether it can
+# match the empty string.  None means any character.  It only has to be a
+# superset: a character in excess just keeps a rule as a candidate.
+def _first_chars(items, flags):
+    first = set()
+    for op, av in items:
+        nullable = False
+        if op is sre_parse.LITERAL:
+            chars = {av}
+        elif op is sre_parse.IN:
+            chars = _set_chars(av, flags)
+        elif op is sre_parse.NOT_LITERAL or op is sre_parse.ANY:
+            chars = _ALL_CHARS
+        elif op is sre_parse.SUBPATTERN:
+            group, add_flags, del_flags, p = av
+            if add_flags & re.IGNORECASE:
+                return None, False
+            chars, nullable = _first_chars(p, flags | add_flags)
+        elif op is getattr(sre_parse, 'ATOMIC_GROUP', None):
+            chars, nullable = _first_chars(av, flags)
+        elif op is sre_parse.BRANCH:
+            chars = set()
+            for alternative in av[1]:
+                alt_chars, alt_nullable = _first_chars(alternative, flags)
+                if alt_chars is None:
+                    return None, False
+                chars |= alt_chars
+                nullable = nullable or alt_nullable
+        elif op in _REPEATS:
+            chars, nullable = _first_chars(av[2], flags)
+            nullable = nullable or av[0] == 0
+        elif op in (sre_parse.AT, sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+            chars, nullable = set(), True
+        else:
+            return None, False
+        if chars is None:
+            return None, False
+        first |= chars
+        if not nullable:
+            return first, False
+    return first, True
+
+def _form_dispatch(relist, reflags, ldict, toknames):
+    if reflags & re.IGNORECASE:
+        return None
+    rules = []
+    for regex in relist:
+        parsed = sre_parse.parse(regex, reflags)
+        first, nullable = _first_chars(parsed, reflags)
+        if first is None or nullable:
+            first = _ALL_CHARS
+        # A string rule whose regex is one literal character ('(?P<name>c)')
+        name = regex[4:regex.index('>')]
+        body = parsed[0][1][3]
+        single = None
+        if (len(body) == 1 and body[0][0] is sre_parse.LITERAL and
+                isinstance(ldict.get(name), str) and name.find('ignore_') < 0):
+            single = toknames[name]
+        rules.append((first, single))
+
+    dispatch = []
+    entries = {}
+    for c in range(256):
+        candidates = tuple(i for i, (first, single) in enumerate(rules) if c in first)
+        if candidates and rules[candidates[0]][1] is not None:
+            dispatch.append(rules[candidates[0]][1])
+            continue
+        if candidates not in entries:
+            entries[candidates] = _form_master_re([relist[i] for i in candidates], reflags, ldict, toknames)[0]
+        dispatch.append(entries[candidates])
+    return dispatch
+
 # -----------------------------------------------------------------------------
 # def _statetoken(s,names)
 #
@@ -843,8 +1065,16 @@ def lex(*, module=None, object=None, debug=False,
             lexobj.lexstateretext[state].extend(lexobj.lexstateretext['INITIAL'])
             lexobj.lexstaterenames[state].extend(lexobj.lexstaterenames['INITIAL'])
 
+    # Dispatch tables by first character, with the same rules in the same order
+    for state, stype in stateinfo.items():
+        relist = regexs[state]
+        if state != 'INITIAL' and stype == 'inclusive':
+            relist = relist + regexs['INITIAL']
+        lexobj.lexstatedispatch[state] = _form_dispatch(relist, reflags, ldict, linfo.toknames)
+
     lexobj.lexstateinfo = stateinfo
     lexobj.lexre = lexobj.lexstatere['INITIAL']
+    lexobj.lexdispatch = lexobj.lexstatedispatch['INITIAL']
     lexobj.lexretext = lexobj.lexstateretext['INITIAL']
     lexobj.lexreflags = reflags
 
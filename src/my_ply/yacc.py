@@ -64,7 +64,13 @@
 import re
 import types
 import sys
+import os
 import inspect
+import importlib
+import importlib.util
+import pickle
+
+__tabversion__ = '3.10'
 
 #-----------------------------------------------------------------------------
 #                     === User configurable parameters ===
@@ -76,6 +82,7 @@ yaccdebug   = True             # Debugging mode.  If set, yacc generates a
                                # a 'parser.out' file in the current directory
 
 debug_file  = 'parser.out'     # Default name of the debugging file
+pickle_file = 'parsetab.pickle' # Default name of the file where the LR tables are cached
 error_count = 3                # Number of symbols that must be shifted to leave recovery mode
 resultlimit = 40               # Size limit of results when running in debug mode.
 
@@ -116,6 +123,10 @@ class NullLogger(object):
 class YaccError(Exception):
     pass
 
+# Exception raised when a cached table was written by an incompatible version
+class VersionError(YaccError):
+    pass
+
 # Format the result message that the parser produces when running in debug mode.
 def format_result(r):
     repr_str = repr(r)
@@ -152,8 +163,16 @@ def format_stack_entry(r):
 #        .endlineno  = Ending line number (optional, set automatically)
 #        .lexpos     = Starting lex position
 #        .endlexpos  = Ending lex position (optional, set automatically)
+# Positions are only set when tracking; until then reading them raises
+# AttributeError, which the engine relies on through hasattr() and getattr().
 
 class YaccSymbol:
+    __slots__ = ('type', 'value', 'lineno', 'endlineno', 'lexpos', 'endlexpos', 'lexer')
+
+    def __init__(self, type, value=None):
+        self.type = type
+        self.value = value
+
     def __str__(self):
         return self.type
 
@@ -218,6 +237,71 @@ class YaccProduction:
     def error(self):
         raise SyntaxError
 
+# This class stands in for YaccProduction in parseopt_notrack(), where the
+# parser keeps plain semantic values on a stack parallel to the state stack
+# instead of YaccSymbol objects.  A single instance is reused for every
+# reduction: p[n] reads stack[base+n] and p[0] is kept in result.  Without
+# symbol objects there is no position information, so lineno(), lexpos() and
+# the related methods raise YaccError; parse with tracking=True if the rules
+# need them.  The only token kept is the first one of type error read from the
+# lexer (errtoken), so that a rule that shifts it can still report where it is.
+
+class YaccValues:
+    __slots__ = ('stack', 'base', 'len', 'result', 'lexer', 'parser', 'errtoken')
+
+    def __init__(self, stack):
+        self.stack = stack
+        self.base = 0
+        self.len = 0
+        self.result = None
+        self.lexer = None
+        self.parser = None
+        self.errtoken = None
+
+    def __getitem__(self, n):
+        if n.__class__ is slice:
+            return [self[i] for i in range(*n.indices(self.len))]
+        elif n > 0:
+            return self.stack[self.base + n]
+        elif n == 0:
+            return self.result
+        else:
+            return self.stack[self.base + 1 + n]
+
+    def __setitem__(self, n, v):
+        if n == 0:
+            self.result = v
+        else:
+            self.stack[self.base + n] = v
+
+    def __len__(self):
+        return self.len
+
+    def no_positions(self):
+        raise YaccError('Symbol positions are not kept by parseopt_notrack(); '
+                        'parse with tracking=True to use them in grammar rules')
+
+    def lineno(self, n):
+        self.no_positions()
+
+    def set_lineno(self, n, lineno):
+        self.no_positions()
+
+    def linespan(self, n):
+        self.no_positions()
+
+    def lexpos(self, n):
+        self.no_positions()
+
+    def set_lexpos(self, n, lexpos):
+        self.no_positions()
+
+    def lexspan(self, n):
+        self.no_positions()
+
+    def error(self):
+        raise SyntaxError
+
 # -----------------------------------------------------------------------------
 #                               == LRParser ==
 #
@@ -230,7 +314,12 @@ class LRParser:
         self.action = lrtab.lr_action
         self.goto = lrtab.lr_goto
         self.errorfunc = errorf
+        # p_error() may take the running parser as a second argument.  At the
+        # end of the input there is no token, so that is the only way for it
+        # to reach the parser's state stack and lexer.
+        self.errorfunc_parser = errorf is not None and errorf.__code__.co_argcount - inspect.ismethod(errorf) == 2
         self.set_defaulted_states()
+        self.set_coded_tables()
         self.errorok = True
 
     def errok(self):
@@ -239,8 +328,7 @@ class LRParser:
     def restart(self):
         del self.statestack[:]
         del self.symstack[:]
-        sym = YaccSymbol()
-        sym.type = '$end'
+        sym = YaccSymbol('$end')
         self.symstack.append(sym)
         self.statestack.append(0)
 
@@ -262,6 +350,53 @@ class LRParser:
     def disable_defaulted_states(self):
         self.defaulted_states = {}
 
+    # Integer-coded tables.
+    # Terminals and nonterminals are numbered and the action/goto tables are laid
+    # out as dense lists indexed by [state][code].  parse() then indexes lists on
+    # every shift and reduce instead of hashing symbol names in a dict of dicts.
+    # A token type is translated to its code once, when the token becomes the
+    # lookahead.  Types unknown to the grammar get an extra code whose column is
+    # empty in every row, so they are reported as syntax errors.
+    def set_coded_tables(self):
+        nstates = max(self.action) + 1
+        terminals = set(['$end', 'error'])
+        for actions in self.action.values():
+            terminals.update(actions)
+        nonterminals = set()
+        for gotos in self.goto.values():
+            nonterminals.update(gotos)
+
+        self.termcodes = dict((name, code) for code, name in enumerate(sorted(terminals)))
+        self.unknowncode = len(terminals)
+        ntcodes = dict((name, code) for code, name in enumerate(sorted(nonterminals)))
+
+        termcodes = self.termcodes
+        self.action_rows = [None] * nstates
+        for state, actions in self.action.items():
+            row = [None] * (len(terminals) + 1)
+            for name, t in actions.items():
+                row[termcodes[name]] = t
+            self.action_rows[state] = row
+
+        # Most states have no gotos at all, so they share a single empty row
+        empty = [None] * len(nonterminals)
+        self.goto_rows = [empty] * nstates
+        for state, gotos in self.goto.items():
+            if gotos:
+                row = [None] * len(nonterminals)
+                for name, g in gotos.items():
+                    row[ntcodes[name]] = g
+                self.goto_rows[state] = row
+
+        # Code of the left-hand side of every production, to index goto_rows
+        self.lhscodes = [ntcodes.get(p.name) for p in self.productions]
+
+        # States entered by shifting the error token.  Without a symbol stack,
+        # this is how parseopt_notrack() knows that an error is on top of it.
+        errorcode = termcodes['error']
+        self.error_states = set(row[errorcode] for row in self.action_rows
+                                if row and row[errorcode] and row[errorcode] > 0)
+
     # parse().
     #
     # This is the core parsing engine.  To operate, it requires a lexer object.
@@ -269,17 +404,34 @@ class LRParser:
     # see the various rule reductions and parsing steps.  tracking turns on position
     # tracking.  In this mode, symbols will record the starting/ending line number and
     # character index.
+    #
+    # The work is done by parsedebug(), which supports both options, or by the
+    # faster parseopt_notrack() when neither of them is requested.
 
     def parse(self, input=None, lexer=None, debug=False, tracking=False):
+        if debug or tracking:
+            return self.parsedebug(input, lexer, debug, tracking)
+        return self.parseopt_notrack(input, lexer)
+
+    # parsedebug().
+    #
+    # General version of the parsing engine, with debugging and tracking support.
+
+    def parsedebug(self, input=None, lexer=None, debug=False, tracking=False):
         # If debugging has been specified as a flag, turn it into a logging object
         if isinstance(debug, int) and debug:
             debug = PlyLogger(sys.stderr)
 
         lookahead = None                         # Current lookahead symbol
         lookaheadstack = []                      # Stack of lookahead symbols
-        actions = self.action                    # Local reference to action table (to avoid lookup on self.)
-        goto    = self.goto                      # Local reference to goto table (to avoid lookup on self.)
+        lcode = None                             # Integer code of the lookahead type
+        actions = self.action_rows               # Local reference to action table (to avoid lookup on self.)
+        goto    = self.goto_rows                 # Local reference to goto table (to avoid lookup on self.)
         prod    = self.productions               # Local reference to production list (to avoid lookup on self.)
+        lhscodes = self.lhscodes                 # Local reference to left-hand side codes
+        termcodes = self.termcodes               # Local reference to terminal codes
+        unknowncode = self.unknowncode
+        errorcode = termcodes['error']
         defaulted_states = self.defaulted_states # Local reference to defaulted states
         pslice  = YaccProduction(None)           # Production object passed to grammar rules
         errorcount = 0                           # Used during error recovery
@@ -301,6 +453,7 @@ class LRParser:
             lexer.input(input)
 
         # Set the token function
+        self.lexer = lexer
         get_token = self.token = lexer.token
 
         # Set up the state and symbol stacks
@@ -308,12 +461,12 @@ class LRParser:
         symstack = self.symstack = []       # Stack of grammar symbols
         pslice.stack = symstack             # Put in the production
         errtoken   = None                   # Err token
+        errlookahead = None                 # Token that produced the last error symbol
 
         # The start state is assumed to be (0,$end)
 
         statestack.append(0)
-        sym = YaccSymbol()
-        sym.type = '$end'
+        sym = YaccSymbol('$end')
         symstack.append(sym)
         state = 0
         while True:
@@ -331,12 +484,14 @@ class LRParser:
                     else:
                         lookahead = lookaheadstack.pop()
                     if not lookahead:
-                        lookahead = YaccSymbol()
-                        lookahead.type = '$end'
+                        lookahead = YaccSymbol('$end')
+                        if tracking:
+                            lookahead.lineno = lexer.lineno
+                            lookahead.lexpos = lexer.lexpos
+                    lcode = termcodes.get(lookahead.type, unknowncode)
 
                 # Check the action table
-                ltype = lookahead.type
-                t = actions[state].get(ltype)
+                t = actions[state][lcode]
             else:
                 t = defaulted_states[state]
                 if debug:
@@ -367,21 +522,20 @@ class LRParser:
                     # reduce a symbol on the stack, emit a production
                     p = prod[-t]
                     pname = p.name
+                    pcode = lhscodes[-t]
                     plen  = p.len
 
                     # Get production function
-                    sym = YaccSymbol()
-                    sym.type = pname       # Production name
-                    sym.value = None
+                    sym = YaccSymbol(pname)       # Production name
 
                     if debug:
                         if plen:
                             debug.info('Action : Reduce rule [%s] with %s and goto state %d', p.str,
                                        '['+','.join([format_stack_entry(_v.value) for _v in symstack[-plen:]])+']',
-                                       goto[statestack[-1-plen]][pname])
+                                       goto[statestack[-1-plen]][pcode])
                         else:
                             debug.info('Action : Reduce rule [%s] with %s and goto state %d', p.str, [],
-                                       goto[statestack[-1]][pname])
+                                       goto[statestack[-1]][pcode])
 
                     if plen:
                         targ = symstack[-plen-1:]
@@ -411,7 +565,7 @@ class LRParser:
                             if debug:
                                 debug.info('Result : %s', format_result(pslice[0]))
                             symstack.append(sym)
-                            state = goto[statestack[-1]][pname]
+                            state = goto[statestack[-1]][pcode]
                             statestack.append(state)
                         except SyntaxError:
                             # If an error was set. Enter error recovery state
@@ -422,6 +576,7 @@ class LRParser:
                             sym.type = 'error'
                             sym.value = 'error'
                             lookahead = sym
+                            lcode = errorcode
                             errorcount = error_count
                             self.errorok = False
 
@@ -430,8 +585,14 @@ class LRParser:
                     else:
 
                         if tracking:
-                            sym.lineno = lexer.lineno
-                            sym.lexpos = lexer.lexpos
+                            # An empty rule starts where the lookahead does.  If
+                            # it was not read yet, that is the lexer position.
+                            if lookahead and hasattr(lookahead, 'lexpos'):
+                                sym.lineno = getattr(lookahead, 'lineno', lexer.lineno)
+                                sym.lexpos = lookahead.lexpos
+                            else:
+                                sym.lineno = lexer.lineno
+                                sym.lexpos = lexer.lexpos
 
                         targ = [sym]
 
@@ -449,7 +610,7 @@ class LRParser:
                             if debug:
                                 debug.info('Result : %s', format_result(pslice[0]))
                             symstack.append(sym)
-                            state = goto[statestack[-1]][pname]
+                            state = goto[statestack[-1]][pcode]
                             statestack.append(state)
                         except SyntaxError:
                             # If an error was set. Enter error recovery state
@@ -459,6 +620,7 @@ class LRParser:
                             sym.type = 'error'
                             sym.value = 'error'
                             lookahead = sym
+                            lcode = errorcode
                             errorcount = error_count
                             self.errorok = False
 
@@ -497,16 +659,21 @@ class LRParser:
                     if errtoken.type == '$end':
                         errtoken = None               # End of file!
                     if self.errorfunc:
-                        if errtoken and not hasattr(errtoken, 'lexer'):
+                        if errtoken and getattr(errtoken, 'lexer', None) is None:
                             errtoken.lexer = lexer
                         self.state = state
                         ## En esta línea se invoca a p_error:
-                        tok = self.errorfunc(errtoken)
+                        if self.errorfunc_parser:
+                            tok = self.errorfunc(errtoken, self)
+                        else:
+                            tok = self.errorfunc(errtoken)
                         if self.errorok:
                             # User must have done some kind of panic
                             # mode recovery on their own.  The
                             # returned token is the next lookahead
                             lookahead = tok
+                            if tok:
+                                lcode = termcodes.get(tok.type, unknowncode)
                             errtoken = None
                             continue
                     else:
@@ -528,9 +695,11 @@ class LRParser:
 
                 # case 1:  the statestack only has 1 entry on it.  If we're in this state, the
                 # entire parse has been rolled back and we're completely hosed.   The token is
-                # discarded and we just keep going.
+                # discarded and we just keep going.  Unless the start state itself accepts the
+                # error token (an error rule that can match at the very start of the input):
+                # then the token is skipped by that rule like anywhere else.
 
-                if len(statestack) <= 1 and lookahead.type != '$end':
+                if len(statestack) <= 1 and lookahead.type != '$end' and actions[state][errorcode] is None:
                     lookahead = None
                     errtoken = None
                     state = 0
@@ -542,9 +711,12 @@ class LRParser:
                 # at the end of the file. nuke the top entry and generate an error token
 
                 # Start nuking entries on the stack
+                # At the end of the file, recovery only makes sense if the grammar
+                # has error rules and no error token has been shifted yet
                 if lookahead.type == '$end':
-                    # Whoa. We're really hosed here. Bail out
-                    return
+                    if not self.error_states or symstack[-1].type == 'error':
+                        # Whoa. We're really hosed here. Bail out
+                        return
 
                 if lookahead.type != 'error':
                     sym = symstack[-1]
@@ -558,16 +730,22 @@ class LRParser:
                         continue
 
                     # Create the error symbol for the first time and make it the new lookahead symbol
-                    t = YaccSymbol()
-                    t.type = 'error'
+                    t = YaccSymbol('error', lookahead)
 
                     if hasattr(lookahead, 'lineno'):
                         t.lineno = t.endlineno = lookahead.lineno
                     if hasattr(lookahead, 'lexpos'):
                         t.lexpos = t.endlexpos = lookahead.lexpos
-                    t.value = lookahead
-                    lookaheadstack.append(lookahead)
+                    if lookahead is not errlookahead:
+                        lookaheadstack.append(lookahead)
+                    elif lookahead.type == '$end':
+                        return
+                    # else: the same token already produced the previous error
+                    # symbol, which was reduced without shifting anything.  Drop
+                    # it as part of the skipped input, or recovery would loop.
+                    errlookahead = lookahead
                     lookahead = t
+                    lcode = errorcode
                 else:
                     sym = symstack.pop()
                     if tracking:
@@ -581,6 +759,281 @@ class LRParser:
             # If we'r here, something really bad happened
             raise RuntimeError('yacc: internal parser error!!!\n')
 
+    # parseopt_notrack().
+    #
+    # Optimized version of parse() used when neither debugging nor position
+    # tracking are requested.  It follows parsedebug() with all of the debug and
+    # tracking code stripped out and attribute lookups hoisted out of the loop.
+    # Instead of a stack of YaccSymbol objects it keeps the semantic values in a
+    # plain list parallel to the state stack, and grammar rules receive a reused
+    # YaccValues view over it, so reductions allocate no symbols or slices.  Any
+    # change to the parsing algorithm must be made in both methods.
+    #
+    # The engine itself is the generator _parseopt_notrack(), shared with
+    # parseincremental().  Here it runs without output, so it never yields.
+
+    def parseopt_notrack(self, input=None, lexer=None):
+        try:
+            next(self._parseopt_notrack(input, lexer, None))
+        except StopIteration as e:
+            return e.value
+        raise RuntimeError('yacc: internal parser error!!!\n')
+
+    # parseincremental().
+    #
+    # Same engine as parseopt_notrack(), but returns an iterator.  Grammar rules
+    # append finished values to the list output (which they must reach on their
+    # own, e.g. through p.lexer) and each one is yielded right after the
+    # reduction that produced it, while the rest of the input is still unread.
+    # The value of the start symbol is discarded.
+
+    def parseincremental(self, output, input=None, lexer=None):
+        return self._parseopt_notrack(input, lexer, output)
+
+    def _parseopt_notrack(self, input, lexer, output):
+        lookahead = None                         # Current lookahead symbol
+        lcode = None                             # Integer code of the lookahead type
+        lookaheadstack = []                      # Stack of lookahead symbols
+        actions = self.action_rows               # Local reference to action table (to avoid lookup on self.)
+        goto    = self.goto_rows                 # Local reference to goto table (to avoid lookup on self.)
+        prod    = self.productions               # Local reference to production list (to avoid lookup on self.)
+        lhscodes = self.lhscodes                 # Local reference to left-hand side codes
+        termcodes = self.termcodes               # Local reference to terminal codes
+        unknowncode = self.unknowncode
+        errorcode = termcodes['error']
+        defaulted_states = self.defaulted_states # Local reference to defaulted states
+        error_states = self.error_states         # Local reference to states with an error on top
+        errorcount = 0                           # Used during error recovery
+
+        # If no lexer was given, we will try to use the lex module
+        if not lexer:
+            from . import lex
+            lexer = lex.lexer
+
+        # Set up the state and value stacks.  In this mode the symbol stack
+        # holds the semantic values themselves.
+        statestack = self.statestack = []   # Stack of parsing states
+        valstack = self.symstack = []       # Stack of semantic values
+        pvalues = YaccValues(valstack)      # Production view passed to grammar rules
+        errtoken   = None                   # Err token
+        errlookahead = None                 # Token that produced the last error symbol
+
+        # Set up the lexer and parser objects on pvalues
+        pvalues.lexer = lexer
+        pvalues.parser = self
+
+        # If input was supplied, pass to lexer
+        if input is not None:
+            lexer.input(input)
+
+        # Set the token function
+        self.lexer = lexer
+        get_token = self.token = lexer.token
+
+        # Bound methods used on every step of the loop
+        statestack_append = statestack.append
+        valstack_append = valstack.append
+
+        # The start state is assumed to be (0,$end)
+
+        statestack_append(0)
+        valstack_append(None)
+        state = 0
+        while True:
+            # Get the next symbol on the input.  If a lookahead symbol
+            # is already set, we just use that. Otherwise, we'll pull
+            # the next token off of the lookaheadstack or from the lexer
+
+            if state not in defaulted_states:
+                if not lookahead:
+                    if not lookaheadstack:
+                        lookahead = get_token()     # Get the next token
+                    else:
+                        lookahead = lookaheadstack.pop()
+                    if not lookahead:
+                        lookahead = YaccSymbol('$end')
+                    lcode = termcodes.get(lookahead.type, unknowncode)
+                    if lcode == errorcode and pvalues.errtoken is None:
+                        pvalues.errtoken = lookahead
+
+                # Check the action table
+                t = actions[state][lcode]
+            else:
+                t = defaulted_states[state]
+
+            if t is not None:
+                if t > 0:
+                    # shift a symbol on the stack
+                    statestack_append(t)
+                    state = t
+
+                    valstack_append(lookahead.value)
+                    lookahead = None
+
+                    # Decrease error count on successful shift
+                    if errorcount:
+                        errorcount -= 1
+                    continue
+
+                if t < 0:
+                    # reduce a symbol on the stack, emit a production
+                    p = prod[-t]
+                    plen  = p.len
+
+                    # The right-hand side is left on the value stack while the
+                    # grammar rule runs: pvalues reads it from there
+                    pvalues.base = len(statestack) - plen - 1
+                    pvalues.len = plen + 1
+                    pvalues.result = None
+
+                    try:
+                        # Call the grammar rule with our special view object
+                        self.state = state
+                        p.callable(pvalues)
+                    except SyntaxError:
+                        # If an error was set. Enter error recovery state
+                        lookaheadstack.append(lookahead)    # Save the current lookahead token
+                        statestack.pop()                    # Pop back one state (before the reduce)
+                        valstack.pop()
+                        state = statestack[-1]
+                        sym = YaccSymbol('error', 'error')
+                        lookahead = sym
+                        lcode = errorcode
+                        errorcount = error_count
+                        self.errorok = False
+                        continue
+
+                    if plen:
+                        del statestack[-plen:]
+                        del valstack[-plen:]
+                    valstack_append(pvalues.result)
+                    state = goto[statestack[-1]][lhscodes[-t]]
+                    statestack_append(state)
+                    if output:
+                        yield from output
+                        del output[:]
+                        # Other parses may have run on this parser meanwhile;
+                        # p_error() and the rules see this one through self
+                        self.lexer = lexer
+                        self.statestack = statestack
+                        self.symstack = valstack
+                    continue
+
+                if t == 0:
+                    return valstack[-1]
+
+            if t is None:
+
+                # We have some kind of parsing error here.  To handle
+                # this, we are going to push the current token onto
+                # the tokenstack and replace it with an 'error' token.
+                # If there are any synchronization rules, they may
+                # catch it.
+                #
+                # In addition to pushing the error token, we call call
+                # the user defined p_error() function if this is the
+                # first syntax error.  This function is only called if
+                # errorcount == 0.
+                if errorcount == 0 or self.errorok:
+                    errorcount = error_count
+                    self.errorok = False
+                    errtoken = lookahead
+                    if errtoken.type == '$end':
+                        errtoken = None               # End of file!
+                    if self.errorfunc:
+                        if errtoken and getattr(errtoken, 'lexer', None) is None:
+                            errtoken.lexer = lexer
+                        self.state = state
+                        ## En esta línea se invoca a p_error:
+                        if self.errorfunc_parser:
+                            tok = self.errorfunc(errtoken, self)
+                        else:
+                            tok = self.errorfunc(errtoken)
+                        if self.errorok:
+                            # User must have done some kind of panic
+                            # mode recovery on their own.  The
+                            # returned token is the next lookahead
+                            lookahead = tok
+                            if tok:
+                                lcode = termcodes.get(tok.type, unknowncode)
+                            errtoken = None
+                            continue
+                    else:
+                        if errtoken:
+                            if hasattr(errtoken, 'lineno'):
+                                lineno = lookahead.lineno
+                            else:
+                                lineno = 0
+                            if lineno:
+                                sys.stderr.write('yacc: Syntax error at line %d, token=%s\n' % (lineno, errtoken.type))
+                            else:
+                                sys.stderr.write('yacc: Syntax error, token=%s' % errtoken.type)
+                        else:
+                            sys.stderr.write('yacc: Parse error in input. EOF\n')
+                            return
+
+                else:
+                    errorcount = error_count
+
+                # case 1:  the statestack only has 1 entry on it.  If we're in this state, the
+                # entire parse has been rolled back and we're completely hosed.   The token is
+                # discarded and we just keep going.  Unless the start state itself accepts the
+                # error token (an error rule that can match at the very start of the input):
+                # then the token is skipped by that rule like anywhere else.
+
+                if len(statestack) <= 1 and lookahead.type != '$end' and actions[state][errorcode] is None:
+                    lookahead = None
+                    errtoken = None
+                    state = 0
+                    # Nuke the pushback stack
+                    del lookaheadstack[:]
+                    continue
+
+                # case 2: the statestack has a couple of entries on it, but we're
+                # at the end of the file. nuke the top entry and generate an error token
+
+                # Start nuking entries on the stack
+                # At the end of the file, recovery only makes sense if the grammar
+                # has error rules and no error token has been shifted yet
+                if lookahead.type == '$end':
+                    if not error_states or statestack[-1] in error_states:
+                        # Whoa. We're really hosed here. Bail out
+                        return
+
+                if lookahead.type != 'error':
+                    if statestack[-1] in error_states:
+                        # Hmmm. Error is on top of stack, we'll just nuke input
+                        # symbol and continue
+                        lookahead = None
+                        continue
+
+                    # Create the error symbol for the first time and make it the new lookahead symbol
+                    t = YaccSymbol('error', lookahead)
+
+                    if hasattr(lookahead, 'lineno'):
+                        t.lineno = t.endlineno = lookahead.lineno
+                    if hasattr(lookahead, 'lexpos'):
+                        t.lexpos = t.endlexpos = lookahead.lexpos
+                    if lookahead is not errlookahead:
+                        lookaheadstack.append(lookahead)
+                    elif lookahead.type == '$end':
+                        return
+                    # else: the same token already produced the previous error
+                    # symbol, which was reduced without shifting anything.  Drop
+                    # it as part of the skipped input, or recovery would loop.
+                    errlookahead = lookahead
+                    lookahead = t
+                    lcode = errorcode
+                else:
+                    valstack.pop()
+                    statestack.pop()
+                    state = statestack[-1]
+
+                continue
+
+            # If we'r here, something really bad happened
+            raise RuntimeError('yacc: internal parser error!!!\n')
+
 # -----------------------------------------------------------------------------
 #                          === Grammar Representation ===
 #
@@ -1301,6 +1754,100 @@ def traverse(x, N, stack, F, X, R, FP):
 class LALRError(YaccError):
     pass
 
+# -----------------------------------------------------------------------------
+#                          === LR Table Cache ===
+#
+# Building the LALR tables is by far the most expensive step of yacc().  The
+# classes and functions below store the finished tables on disk, together
+# with the signature of the grammar that produced them, so that later runs
+# can skip the construction entirely as long as the grammar is unchanged.
+# -----------------------------------------------------------------------------
+
+# This class serves as a minimal standin for Production objects when
+# reading table data from files.   It only contains information
+# actually used by the LR parsing engine, plus some additional
+# debugging information.
+class MiniProduction(object):
+    def __init__(self, str, name, len, func, file, line):
+        self.name     = name
+        self.len      = len
+        self.func     = func
+        self.callable = None
+        self.file     = file
+        self.line     = line
+        self.str      = str
+
+    def __str__(self):
+        return self.str
+
+    def __repr__(self):
+        return 'MiniProduction(%s)' % self.str
+
+    # Bind the production function name to a callable
+    def bind(self, pdict):
+        if self.func:
+            self.callable = pdict[self.func]
+
+# Tables read back from a cache file.  It offers the same attributes that
+# LRParser expects from an LRTable, without any of the construction machinery.
+class CachedLRTable(object):
+    def __init__(self, lr_action, lr_goto, lr_productions):
+        self.lr_action      = lr_action
+        self.lr_goto        = lr_goto
+        self.lr_productions = lr_productions
+
+    # Bind all production function names to callable objects in pdict
+    def bind_callables(self, pdict):
+        for p in self.lr_productions:
+            p.bind(pdict)
+
+# -----------------------------------------------------------------------------
+# read_pickle()
+#
+# Load the tables stored in filename.  Returns a tuple (signature, table), where
+# signature is the grammar signature the tables were built from.
+# -----------------------------------------------------------------------------
+def read_pickle(filename):
+    with open(filename, 'rb') as in_f:
+        tabversion = pickle.load(in_f)
+        if tabversion != __tabversion__:
+            raise VersionError('yacc table file version is out of date')
+        signature  = pickle.load(in_f)
+        lr_action  = pickle.load(in_f)
+        lr_goto    = pickle.load(in_f)
+        productions = pickle.load(in_f)
+
+    lr_productions = [MiniProduction(*p) for p in productions]
+    return signature, CachedLRTable(lr_action, lr_goto, lr_productions)
+
+# -----------------------------------------------------------------------------
+# write_pickle()
+#
+# Store the tables of lr in filename, tagged with the grammar signature.  The
+# file is written under a temporary name and then moved into place, so that
+# several processes building the same grammar at once never see a partial file.
+# -----------------------------------------------------------------------------
+def write_pickle(lr, filename, signature):
+    productions = []
+    for p in lr.lr_productions:
+        if p.func:
+            productions.append((p.str, p.name, p.len, p.func, os.path.basename(p.file), p.line))
+        else:
+            productions.append((str(p), p.name, p.len, None, None, None))
+
+    tmpname = '%s.%d.tmp' % (filename, os.getpid())
+    try:
+        with open(tmpname, 'wb') as outf:
+            pickle.dump(__tabversion__, outf, pickle.HIGHEST_PROTOCOL)
+            pickle.dump(signature, outf, pickle.HIGHEST_PROTOCOL)
+            pickle.dump(lr.lr_action, outf, pickle.HIGHEST_PROTOCOL)
+            pickle.dump(lr.lr_goto, outf, pickle.HIGHEST_PROTOCOL)
+            pickle.dump(productions, outf, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmpname, filename)
+    finally:
+        if os.path.exists(tmpname):
+            os.remove(tmpname)
+
 
 # -----------------------------------------------------------------------------
 #                             == LRTable ==
@@ -1923,6 +2470,117 @@ class LRTable:
             goto[st] = st_goto
             st += 1
 
+# -----------------------------------------------------------------------------
+# write_table()
+#
+# Write the tables of lr as a standalone Python module named tabmodule.  Besides
+# the compact action/goto tables and the production list, the generated module
+# builds a ready-to-use LRParser bound to the rule functions of the grammar
+# module named modulename, so importing it needs no reflection or table work.
+# -----------------------------------------------------------------------------
+def write_table(lr, tabmodule, outputdir, signature, modulename):
+    basemodulename = tabmodule.split('.')[-1]
+    filename = os.path.join(outputdir, basemodulename) + '.py'
+    tmpname = '%s.%d.tmp' % (filename, os.getpid())
+    try:
+        with open(tmpname, 'w') as f:
+            f.write('''
+# %s
+# This file is automatically generated. Do not edit.
+# pylint: disable=W,C,R
+_tabversion = %r
+
+_lr_signature = %r
+_lr_module = %r
+''' % (os.path.basename(filename), __tabversion__, signature, modulename))
+
+            # One dict literal per state: it costs more bytes than factoring out
+            # the names, but loads from the compiled module without any loops
+            f.write('\n_lr_action = {\n')
+            for state, actions in lr.lr_action.items():
+                f.write('  %r: %r,\n' % (state, actions))
+            f.write('}\n')
+
+            f.write('\n_lr_goto = {\n')
+            for state, gotos in lr.lr_goto.items():
+                f.write('  %r: %r,\n' % (state, gotos))
+            f.write('}\n\n')
+
+            # Write production table
+            f.write('_lr_productions = [\n')
+            for p in lr.lr_productions:
+                if p.func:
+                    f.write('  (%r,%r,%d,%r,%r,%d),\n' % (p.str, p.name, p.len,
+                                                          p.func, os.path.basename(p.file), p.line))
+                else:
+                    f.write('  (%r,%r,%d,None,None,None),\n' % (str(p), p.name, p.len))
+            f.write(']\n')
+
+            f.write('''
+# Ready-to-use parser bound to the rule functions of the grammar module.  It is
+# built on first use, so that yacc() can check the tables without binding them
+# and then share this parser.
+def __getattr__(name):
+    global parser
+    if name != 'parser':
+        raise AttributeError('module %%r has no attribute %%r' %% (__name__, name))
+    import importlib
+    from %s import bind_tables
+    parser = bind_tables(_lr_action, _lr_goto, _lr_productions, importlib.import_module(_lr_module))
+    return parser
+''' % __name__)
+        os.replace(tmpname, filename)
+    finally:
+        if os.path.exists(tmpname):
+            os.remove(tmpname)
+    importlib.invalidate_caches()
+    # A previous version of the module may already be imported (yacc() imports
+    # it to check the signature): drop it, so the next import reads this one
+    sys.modules.pop(tabmodule, None)
+
+# -----------------------------------------------------------------------------
+# read_table()
+#
+# Import the module generated by write_table().  Returns a tuple
+# (signature, table) like read_pickle().  import_table() only imports it and
+# checks its version.  Given the outputdir write_table() used, the module is
+# loaded from the file written there instead of wherever the module search
+# path finds a module with that name.
+# -----------------------------------------------------------------------------
+def import_table(module, outputdir=None):
+    if isinstance(module, types.ModuleType):
+        parsetab = module
+    elif outputdir is None:
+        parsetab = importlib.import_module(module)
+    else:
+        filename = os.path.abspath(os.path.join(outputdir, module.split('.')[-1]) + '.py')
+        parsetab = sys.modules.get(module)
+        if parsetab is None or getattr(parsetab, '__file__', None) != filename:
+            spec = importlib.util.spec_from_file_location(module, filename)
+            parsetab = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(parsetab)
+            sys.modules[module] = parsetab
+
+    if parsetab._tabversion != __tabversion__:
+        raise VersionError('yacc table file version is out of date')
+    return parsetab
+
+def read_table(module):
+    parsetab = import_table(module)
+    lr_productions = [MiniProduction(*p) for p in parsetab._lr_productions]
+    return parsetab._lr_signature, CachedLRTable(parsetab._lr_action, parsetab._lr_goto, lr_productions)
+
+# -----------------------------------------------------------------------------
+# bind_tables()
+#
+# Build an LRParser straight from table data and the module that defines the
+# grammar rules.  This is what modules generated by write_table() call.
+# -----------------------------------------------------------------------------
+def bind_tables(lr_action, lr_goto, productions, module):
+    lr = CachedLRTable(lr_action, lr_goto, [MiniProduction(*p) for p in productions])
+    lr.bind_callables(vars(module))
+    return LRParser(lr, getattr(module, 'p_error', None))
+
 # -----------------------------------------------------------------------------
 #                            === INTROSPECTION ===
 #
@@ -2108,8 +2766,8 @@ class ParserReflect(object):
             self.modules.add(module)
 
             argcount = self.error_func.__code__.co_argcount - ismethod
-            if argcount != 1:
-                self.log.error('%s:%d: p_error() requires 1 argument', efile, eline)
+            if argcount not in (1, 2):
+                self.log.error('%s:%d: p_error() requires 1 or 2 arguments', efile, eline)
                 self.error = True
 
     # Get the tokens map
@@ -2271,7 +2929,8 @@ class ParserReflect(object):
 
 def yacc(*, debug=yaccdebug, module=None, start=None,
          check_recursion=True, optimize=False, debugfile=debug_file,
-         debuglog=None, errorlog=None):
+         debuglog=None, errorlog=None, picklefile=pickle_file, tabmodule=None,
+         outputdir=None):
 
     # Reference to the parsing method of the last built parser
     global parse
@@ -2304,6 +2963,47 @@ def yacc(*, debug=yaccdebug, module=None, start=None,
     if pinfo.error:
         raise YaccError('Unable to build parser')
 
+    # Check signature against the table cache (if any).  A generated table
+    # module takes the place of the pickle file when one is requested.
+    signature = pinfo.signature()
+
+    if outputdir is None:
+        srcfile = pdict.get('__file__')
+        outputdir = os.path.dirname(srcfile) if srcfile else os.getcwd()
+
+    if tabmodule:
+        picklefile = None
+    elif picklefile:
+        picklefile = os.path.join(outputdir, picklefile)
+
+    if tabmodule or picklefile:
+        # Read the tables
+        try:
+            if tabmodule:
+                parsetab = import_table(tabmodule, outputdir)
+                # The generated module binds its own parser to the rules of the
+                # grammar module it was written for: share it instead of
+                # building a second one from the same tables
+                if (optimize or parsetab._lr_signature == signature) and parsetab._lr_module == pdict.get('__name__'):
+                    parser = parsetab.parser
+                    parse = parser.parse
+                    return parser
+                read_signature, lr = read_table(parsetab)
+            else:
+                read_signature, lr = read_pickle(picklefile)
+            if optimize or (read_signature == signature):
+                try:
+                    lr.bind_callables(pinfo.pdict)
+                    parser = LRParser(lr, pinfo.error_func)
+                    parse = parser.parse
+                    return parser
+                except Exception as e:
+                    errorlog.warning('There was a problem loading the table file: %r', e)
+        except VersionError as e:
+            errorlog.warning(str(e))
+        except Exception:
+            pass
+
     if debuglog is None:
         if debug:
             try:
@@ -2484,6 +3184,27 @@ def yacc(*, debug=yaccdebug, module=None, start=None,
                 errorlog.warning('Rule (%s) is never reduced', rejected)
                 warned_never.append(rejected)
 
+    # Write the tables to the cache so the next run can skip all of the above
+    if tabmodule:
+        if isinstance(tabmodule, types.ModuleType):
+            errorlog.warning("Can't write tables to an already imported module %r", tabmodule.__name__)
+        else:
+            # The generated module imports the grammar module by name.  Run as a
+            # script it is __main__, so use the name it has when imported.
+            modulename = pdict.get('__name__')
+            if modulename == '__main__' and pdict.get('__file__'):
+                spec = pdict.get('__spec__')
+                modulename = spec.name if spec else os.path.splitext(os.path.basename(pdict['__file__']))[0]
+            try:
+                write_table(lr, tabmodule, outputdir, signature, modulename)
+            except IOError as e:
+                errorlog.warning("Couldn't create %r. %s" % (tabmodule, e))
+    elif picklefile:
+        try:
+            write_pickle(lr, picklefile, signature)
+        except IOError as e:
+            errorlog.warning("Couldn't create %r. %s" % (picklefile, e))
+
     # Build the parser
     lr.bind_callables(pinfo.pdict)
     parser = LRParser(lr, pinfo.error_func)
@@ -1,5 +1,7 @@
-from my_ply.lex import lex, LexToken
-from my_ply.yacc import yacc
+from my_ply.lex import lex, LexToken, ListLexer
+from my_ply.yacc import yacc, YaccError
+from array import array
+from collections import Counter
 import functools
 
 tokens = (
@@ -110,15 +112,72 @@ def t_IDENTIFICADOR(t):
   t.type = reserved_map.get(t.value, "IDENTIFICADOR")
   return t
 t_NUMERO = r'(\d*\.\d+)|(0x)?\d+'
-#            [    comillas dobles   ] [     comillas simples      ] [backtick]
-t_STRING = r'("([^\\"]|\\"|\\[^"])*")|(\'([^\\\']|\\\'|\\[^\'])*\')|(`[^`$]*`)'
 t_RE = r'(/\ /|/[^/\*\ ]([^\\/\n\r]|\\/|\\\\/|\\(\(|\)|[a-z]|\.|\d))*/)g?(i|m)?'
-t_COMENTARIO_UL = r'//[^\n\r]*'
-def t_COMENTARIO_ML(t):
-  r'/\*([^\*]|\*[^/])*\*/'
-  t.type = "COMENTARIO_ML"
-  t.lexer.lineno += t.value.count('\n')
+
+# Los comentarios y los strings pueden ser muy largos (licencias, datos en base64),
+# así que la regla sólo reconoce cómo empiezan y el final se busca con str.find en
+# lugar de con una expresión regular que avanza de a un caracter. Cada función
+# genera lo mismo que la expresión regular que reemplaza, también cuando el token
+# no se cierra.
+def tokenHasta(t, fin):
+  t.value = t.lexer.lexdata[t.lexpos:fin]
+  t.lexer.lexpos = fin
   return t
+
+def finComentarioML(fuente, inicio):
+  # Como /\*([^\*]|\*[^/])*\*/ : un '*' que no cierra se come el caracter que le
+  # sigue, así que en '/* **/' el segundo '*' no cierra. -1 si no se cierra.
+  i = inicio + 2
+  while True:
+    i = fuente.find('*', i)
+    if i < 0 or i + 1 == len(fuente):
+      return -1
+    if fuente[i+1] == '/':
+      return i + 2
+    i += 2
+
+def finString(fuente, inicio, comilla):
+  # Como "([^\\"]|\\"|\\[^"])*" : una barra se come el caracter que le sigue,
+  # sea o no la comilla. -1 si no se cierra.
+  i = inicio + 1
+  cierre = fuente.find(comilla, i)
+  while cierre >= 0:
+    barra = fuente.find('\\', i, cierre)
+    if barra < 0:
+      return cierre + 1
+    i = barra + 2
+    if i > cierre:
+      cierre = fuente.find(comilla, i)
+  return -1
+
+def t_STRING(t):
+  r'"|\''
+  fin = finString(t.lexer.lexdata, t.lexpos, t.value)
+  if fin < 0: # Ninguna regla reconoce la comilla sola: es el mismo token que arma t_error
+    t.type = "error"
+    return t
+  return tokenHasta(t, fin)
+
+def t_COMENTARIO_UL(t):
+  r'//'
+  fuente = t.lexer.lexdata
+  fin = len(fuente)
+  for salto in '\n\r':
+    i = fuente.find(salto, t.lexpos, fin)
+    if i >= 0:
+      fin = i
+  return tokenHasta(t, fin)
+
+def t_COMENTARIO_ML(t):
+  r'/\*'
+  fin = finComentarioML(t.lexer.lexdata, t.lexpos)
+  if fin < 0: # Sin cierre, de las demás reglas sólo t_DIV reconoce '/*'
+    t.type = "DIV"
+    t.value = '/'
+    t.lexer.lexpos = t.lexpos + 1
+    return t
+  return tokenHasta(t, fin)
+
 t_ASIGNACION1 = r'='
 t_ASIGNACION2 = r'\+=|\*=|-=|/=|\|=|<<=|>>=|%='
 t_ABRE_PAREN = r'\('
@@ -148,22 +207,30 @@ t_ACCESO2 = r'\?\.|\!\.'
 t_COMA = r','
 t_ESPACIO = r'(\ |\t)+'
 def t_FORMAT_STRING_COMPLETE(t):
-  r'(`[^`]*`)'
-  t.type = "FORMAT_STRING_COMPLETE"
-  t.lexer.lineno += t.value.count('\n')
-  return t
+  r'`'
+  fin = t.lexer.lexdata.find('`', t.lexpos + 1)
+  if fin < 0: # Ninguna regla reconoce el backtick solo: es el mismo token que arma t_error
+    t.type = "error"
+    return t
+  return tokenHasta(t, fin + 1)
 
-def t_SALTO(t):
-  r'\n'
-  t.type = "SALTO"
-  t.lexer.lineno += t.value.count('\n')
-  return t
+t_SALTO = r'\n'
 
 def t_error(t):
   t.value = t.value[0]
   t.lexer.skip(1)
   return t
 
+# Reglas vacías: no hay un no terminal vacio, cada una se escribe directamente
+# con %prec VACIO (así se ahorra una reducción por cada una, y después de casi
+# cada token hay un s vacío). VACIO es la menor precedencia: en un conflicto
+# shift/reduce con una regla vacía se hace shift si el token tiene precedencia
+# en esta tabla, y se reduce la regla vacía si no la tiene.
+#   X : %prec VACIO          en su propia función, si la acción es p[0] = []
+#   X : ... | %prec VACIO    como alternativa, si la acción ya distingue el
+#                            caso vacío por len(p) == 1 (ver modificador_opcional)
+# Una regla vacía nueva tiene que llevar %prec VACIO: sin precedencia, yacc
+# resuelve todos sus conflictos haciendo shift.
 precedence = (
   ('left', 'VACIO'),
   ('left', 'ESPACIOS'),
@@ -195,8 +262,15 @@ precedence = (
   ('left', 'IS'),
 )
 
+# El lexer se construye una sola vez (validar las reglas y compilar la expresión
+# regular maestra es caro). Cada tokenización usa un clon de este prototipo.
+lexer = lex()
+
+def nuevoLexer():
+  return lexer.clone()
+
 def tokenizar(contenido):
-  lexer = lex()
+  lexer = nuevoLexer()
   lexer.input(contenido)
   resultado = []
   while True:
@@ -206,19 +280,69 @@ def tokenizar(contenido):
     resultado.append(t)
   return resultado
 
+# Código de cada tipo de token en tokenizar_columnar: su posición en esta tupla
+tiposDeToken = tokens + ('error',)
+codigoDeTipo = {tipo: codigo for codigo, tipo in enumerate(tiposDeToken)}
+
+class TokensColumnares:
+  # Los tokens de un código fuente en columnas paralelas (código de tipo, inicio y
+  # fin) guardadas en arrays compactos, sin un LexToken por token. El valor de un
+  # token es fuente[inicio:fin] y se arma recién cuando se pide
+  __slots__ = ('fuente', 'tipos', 'inicios', 'fines')
+  def __init__(self, fuente):
+    self.fuente = fuente
+    self.tipos = array('B')
+    self.inicios = array('l')
+    self.fines = array('l')
+  def __len__(self):
+    return len(self.tipos)
+  def tipo(self, i):
+    return tiposDeToken[self.tipos[i]]
+  def valor(self, i):
+    return self.fuente[self.inicios[i]:self.fines[i]]
+  def valores(self):
+    fuente = self.fuente
+    for inicio, fin in zip(self.inicios, self.fines):
+      yield fuente[inicio:fin]
+  def cantidadPorTipo(self):
+    return {tiposDeToken[codigo]: cantidad for codigo, cantidad in Counter(self.tipos).items()}
+
+def tokenizar_columnar(contenido):
+  lexer = nuevoLexer()
+  lexer.input(contenido)
+  resultado = TokensColumnares(contenido)
+  tipos = resultado.tipos
+  inicios = resultado.inicios
+  fines = resultado.fines
+  while True:
+    t = lexer.token()
+    if not t:
+      break
+    tipos.append(codigoDeTipo[t.type])
+    inicios.append(t.lexpos)
+    fines.append(t.lexpos + len(t.value))
+  return resultado
+
 def token(tipo, valor, linea, col, pos):
-  t = LexToken()
-  t.type = tipo
-  t.value = valor
+  t = LexToken(tipo, valor, pos)
   t.lineno = linea
   t.colno = col
-  t.lexpos = pos
   return t
 
+def cerrarCorrida(primero, corrida):
+  # corrida viene al revés (ver p_corrida_no_vacia)
+  corrida.append(primero)
+  corrida.reverse()
+  return corrida
+
 def concatenar(a, b):
-  if type(a) != type([]):
+  if a is VACIO:
+    a = []
+  elif type(a) != type([]):
     a = [a]
-  if type(b) != type([]):
+  if b is VACIO:
+    b = []
+  elif type(b) != type([]):
     b = [b]
   resultado = []
   for x in a:
@@ -227,23 +351,130 @@ def concatenar(a, b):
     resultado.append(x)
   return resultado
 
-def p_error(t):
+# Los espacios, saltos de línea y comentarios (trivia) se guardan como el string del
+# token, sin un nodo para cada uno: casi todos terminan en abre o cierra de algún nodo,
+# donde restore los copia tal cual. Sólo se convierten en nodos los que quedan como
+# elementos de una lista de declaraciones.
+def nodoTrivia(texto):
+  if texto[0] == '/':
+    return AST_comentario(texto)
+  if texto[0] == '\n':
+    return AST_salto(texto)
+  return AST_espacios(texto)
+
+def materializar(skippeables):
+  return [nodoTrivia(x) if type(x) is str else x for x in skippeables]
+
+class ParseError(Exception):
+  # Error al parsear un archivo. Guarda el token donde se detectó (None si no
+  # hay uno, por ejemplo al llegar al fin del archivo), su línea y columna y la
+  # pila de estados del parser que lo detectó. Sin token, la posición es la del
+  # lexer de ese parser al fallar.
+  def __init__(self, mensaje, token=None, parser=None):
+    self.token = token
+    self.mensaje = mensaje
+    self.estados = []
+    self.linea = None
+    self.columna = None
+    if token is not None:
+      self.linea = token.lineno
+      self.columna = token.colno
+    super().__init__(self.descripcion())
+    if parser is not None:
+      self.ubicar(parser)
+  def ubicar(self, parser):
+    # Completa el error con el estado del parser (los que se levantan armando
+    # el AST no lo conocen: lo completa quien llamó al parser)
+    self.estados = list(parser.statestack)
+    if self.token is None:
+      self.linea = parser.lexer.lineno
+      self.columna = parser.lexer.colno
+    self.args = (self.descripcion(),)
+  def descripcion(self):
+    return f'Error en línea {self.linea}, columna {self.columna}: {self.mensaje}'
+
+class ErrorDeSintaxis(ParseError):
+  # La entrada no respeta la gramática (lo detecta p_error)
+  pass
+
+class ConstruccionInvalida(ParseError):
+  # La gramática aceptó la entrada pero la combinación de nodos no tiene sentido
+  pass
+
+def p_error(t, parser):
   if t is None:
-    print('EoF')
+    error = ErrorDeSintaxis('Fin de archivo inesperado', None, parser)
   else:
-    print(f'Error en línea {t.lineno}, columna {t.colno}: {t.type} ({t.value!r})')
-  logParser()
-  exit(1)
+    error = ErrorDeSintaxis(f'{t.type} ({t.value!r}) inesperado', t, parser)
+  # Parseando con recuperación (ver parsearConRecuperacion) el lexer tiene la
+  # lista donde se anotan los errores en lugar de cortar el parseo
+  errores = getattr(parser.lexer, 'errores', None)
+  if errores is None:
+    raise error
+  errores.append(error)
 
 def es_identificador_sp(s):
   return s in ['abstract','static','private','protected','readonly','get','set','type']
 
 def p_start(p): # AST_programa
   '''
-  start : programa
+  start : programa_principal
   '''
   p[0] = AST_programa(p[1])
 
+# PROGRAMA_PRINCIPAL : [AST_nodo] ###################################################################
+''' El programa del nivel superior del archivo es como un programa, pero recursivo a izquierda
+    para que cada declaración se pueda entregar apenas se reduce (ver iter_declaraciones)
+    PP -> lambda                                    {lambda}
+    PP -> SF                                        {skip, comentario}
+    PP -> PP D                                      p(D)
+    PP -> PP error ; | PP error \n | PP error       como en PU
+''' #################################################################################################
+def p_programa_principal_vacio(p): # [AST_nodo]
+  '''
+  programa_principal : %prec VACIO
+  '''
+  p[0] = []
+
+def p_programa_principal_con_skip(p): # [AST_skippeable]
+  '''
+  programa_principal : sf
+  '''
+  s = materializar(p[1])
+  salida = getattr(p.lexer, 'salida', None)
+  if salida is not None: # iter_declaraciones: se entrega ya y no se guarda
+    salida.extend(s)
+    s = []
+  p[0] = s
+
+def p_programa_principal_no_vacio(p): # [AST_declaracion]
+  '''
+  programa_principal : programa_principal declaracion opt_cierre
+  '''
+  declaraciones = p[1]  # [AST_nodo]
+  declaracion = p[2]    # AST_declaracion
+  s = p[3]              # [AST_skippeable]
+  declaracion.clausura(s)
+  salida = getattr(p.lexer, 'salida', None)
+  if salida is None:
+    declaraciones.append(declaracion)
+  else: # iter_declaraciones: se entrega ya y no se guarda
+    salida.extend(sanitizar([declaracion]))
+  p[0] = declaraciones
+
+def p_programa_principal_error(p): # [AST_nodo]
+  '''
+  programa_principal : programa_principal error PUNTO_Y_COMA
+                     | programa_principal error SALTO
+  '''
+  p[0] = agregarErrorHastaSeparador(p)
+
+def p_programa_principal_error_final(p): # [AST_nodo]
+  '''
+  programa_principal : programa_principal error
+  '''
+  p[0] = agregarErrorHastaLookahead(p)
+
 # PROGRAMA : [AST_nodo] #############################################################################
 ''' Un programa puede ser ...
     P -> PU     ... una lista de declaraciones      p(D) U {lambda}    : (AST_declaracion) : [ P ]
@@ -259,33 +490,91 @@ def p_programa_que_empieza_con_skip(p): # [AST_nodo]
   '''
   programa : sf programa_util
   '''
-  p[0] = concatenar(p[1], p[2])
+  p[0] = concatenar(materializar(p[1]), p[2])
 
 # PROGRAMA_ÚTIL : [AST_nodo] ########################################################################
 ''' Un programa útil es una lista de declaraciones (no puede empezar con skippeables)
     PU -> lambda                                    {lambda}
-    PU -> D PU                                      p(D)
+    PU -> PU D                                      p(D)
+    PU -> PU error ;                                Al recuperarse de un error de sintaxis, se saltea todo hasta
+    PU -> PU error \n                               el próximo ; o salto de línea y se sigue con la próxima declaración,
+    PU -> PU error                                  o hasta la } que cierra el bloque (o el final del archivo)
+    Es recursivo a izquierda: la lista crece de a una declaración sin copiarse y un error sólo
+    descarta la declaración en la que ocurrió.
 ''' #################################################################################################
 def p_programa_util_vacio(p): # [AST_nodo]
   '''
-  programa_util : vacio
+  programa_util : %prec VACIO
   '''
   p[0] = []
 
 def p_programa_util_no_vacio(p): # [AST_declaracion]
   '''
-  programa_util : declaracion opt_cierre programa_util
+  programa_util : programa_util declaracion opt_cierre
   '''
-  declaracion = p[1]  # AST_declaracion
-  s = p[2]            # [AST_skippeable]
-  rec = p[3]          # [AST_declaracion]
+  declaraciones = p[1]  # [AST_nodo]
+  declaracion = p[2]    # AST_declaracion
+  s = p[3]              # [AST_skippeable]
   declaracion.clausura(s)
-  p[0] = concatenar(declaracion, rec)
+  declaraciones.append(declaracion)
+  p[0] = declaraciones
+
+def p_programa_util_error(p): # [AST_nodo]
+  '''
+  programa_util : programa_util error PUNTO_Y_COMA
+                | programa_util error SALTO
+  '''
+  p[0] = agregarErrorHastaSeparador(p)
+
+def p_programa_util_error_final(p): # [AST_nodo]
+  '''
+  programa_util : programa_util error
+  '''
+  p[0] = agregarErrorHastaLookahead(p)
+
+# Sólo se llega a las reglas con error desde parsearConRecuperacion, con tracking
+# y un LexerRecuperacion, así que se conocen las posiciones y el código fuente
+def agregarErrorHastaSeparador(p):
+  lexer = lexerRecuperacion(p)
+  fin = p.lexpos(3) + len(p[3])
+  return agregarError(p[1], lexer.lexdata[p.lexpos(2):fin])
+
+def agregarErrorHastaLookahead(p):
+  # Se reduce al ver la } que cierra el bloque o el fin del archivo: lo
+  # salteado llega hasta donde empieza ese lookahead
+  lexer = lexerRecuperacion(p)
+  return agregarError(p[1], lexer.lexdata[p.lexpos(2):lexer.inicioLookahead])
+
+def lexerRecuperacion(p):
+  # Las reglas con error sólo se reducen parseando como parsearConRecuperacion:
+  # con un LexerRecuperacion y con tracking, que es lo que les da posición a
+  # los no terminales como p[1] (el motor rápido ni siquiera tiene símbolos)
+  if not isinstance(p.lexer, LexerRecuperacion):
+    # Sin recuperación p_error corta el parseo, así que el error lo entregó el
+    # lexer: un caracter que no empieza ningún token (ver t_error). Es el primero
+    # que se leyó, y el motor rápido lo guarda porque no tiene p.slice
+    token = p.slice[2] if hasattr(p, 'slice') else p.errtoken
+    raise ErrorDeSintaxis(f'Caracter inválido {p[2]!r}', token, p.parser)
+  if not (hasattr(p, 'slice') and hasattr(p.slice[1], 'lexpos')):
+    raise YaccError('Las reglas de error sólo se reducen parseando con tracking=True (ver parsearConRecuperacion)')
+  # Un caracter inválido (ver t_error) llega como el token error, y no pasa por
+  # p_error si la gramática lo acepta ahí
+  errores = p.lexer.errores
+  if isinstance(p.slice[2], LexToken) and not (len(errores) > 0 and errores[-1].token is p.slice[2]):
+    errores.append(ErrorDeSintaxis(f'Caracter inválido {p[2]!r}', p.slice[2], p.parser))
+  return p.lexer
+
+def agregarError(declaraciones, texto):
+  if len(declaraciones) > 0 and type(declaraciones[-1]) is AST_error: # Errores seguidos se unen en uno
+    declaraciones[-1].texto += texto
+  else:
+    declaraciones.append(AST_error(texto))
+  return declaraciones
 
 # SKIPPEABLE_FORZADO : [AST_skippeable] #############################################################
 ''' Un skippeable forzado debe tener al menos un skippeable y puede seguir con más skippeables
-    SF -> skip S       {skip}         : AST_espacios
-    SF -> comentario S {comentario}   : AST_comentario
+    SF -> skip S       {skip}         : str (ver nodoTrivia)
+    SF -> comentario S {comentario}   : str (ver nodoTrivia)
 ''' #################################################################################################
 def p_sf_espacios(p): # [AST_skippeable]
   '''
@@ -301,10 +590,36 @@ def p_sf_salto(p): # [AST_skippeable]
 
 def p_sf_comentario(p): # [AST_skippeable]
   '''
-  sf : COMENTARIO_UL s
-     | COMENTARIO_ML s
+  sf : COMENTARIO_UL corrida
+     | COMENTARIO_ML corrida
+  '''
+  p[0] = cerrarCorrida(p[1], p[2])
+
+# CORRIDA : [str] (al revés) ########################################################################
+''' Lo que sigue a un skippeable se arma al revés, agregando cada token al final de la misma lista,
+    y se da vuelta una sola vez en la regla que empieza la corrida (ver cerrarCorrida). Si la cola
+    fuera un S, cada paso copiaría todo lo que viene después y una corrida de n saltos o
+    comentarios costaría O(n^2).
+    R -> lambda    {lambda}
+    R -> skip R    {skip}
+    R -> comentario R {comentario}
+''' #################################################################################################
+def p_corrida_vacia(p): # [str]
+  '''
+  corrida : %prec VACIO
+  '''
+  p[0] = []
+
+def p_corrida_no_vacia(p): # [str]
+  '''
+  corrida : ESPACIO corrida
+          | SALTO corrida
+          | COMENTARIO_UL corrida
+          | COMENTARIO_ML corrida
   '''
-  p[0] = concatenar(AST_comentario(p[1]), p[2])
+  corrida = p[2]
+  corrida.append(p[1])
+  p[0] = corrida
 
 # SKIPPEABLE_OPCIONAL : [AST_skippeable] ############################################################
 ''' Un skippeable opcional puede ser ...
@@ -313,7 +628,7 @@ def p_sf_comentario(p): # [AST_skippeable]
 ''' #################################################################################################
 def p_skippeable_vacio(p): # [AST_nodo]
   '''
-  s : vacio
+  s : %prec VACIO
   '''
   p[0] = []
 
@@ -383,8 +698,7 @@ def p_declaracion_function_decl(p): # AST_declaracion_funcion
   rec = p[3]            # AST_funcion_incompleta | AST_invocacion
   # Si la estoy declarando, no debería haber una invocación
   if type(rec) is AST_invocacion:
-    print("ERROR p_declaracion_function_decl")
-    exit(0)
+    raise ConstruccionInvalida("Se esperaba la definición de la función pero hay una invocación", None, p.parser)
   nombre = aplicarModificador(nombre, opt_decorador)
   funcion = AST_declaracion_funcion(nombre, rec)
   p[0] = funcion
@@ -418,9 +732,10 @@ def p_parametros(p): # AST_parametros
   '''
   abre = AST_sintaxis(p[1])
   s1 = concatenar(abre, p[2])       # [AST_skippeable]
-  lista = p[3]                      # [AST_identificador]
+  lista = p[3]                      # [AST_identificador] (al revés)
   cierra = AST_sintaxis(p[4])       # AST_sintaxis
   cierra = concatenar(cierra, p[5]) # [AST_skippeable]
+  lista.reverse()
   parametros = AST_parametros(lista)
   parametros.apertura(s1)
   parametros.clausura(cierra)
@@ -440,7 +755,7 @@ def p_cuerpo(p): # AST_cuerpo
 
 def p_identificadores_parametros_vacio(p): # [AST_identificador | AST_identificador_objeto]
   '''
-  identificadores_parametros : vacio
+  identificadores_parametros : %prec VACIO
   '''
   p[0] = []
 
@@ -458,8 +773,9 @@ def p_identificadores_parametros_primer_identificador(p): # [AST_identificador |
   opt_mod = p[2]            # AST_decorador | [AST_skippeable]
   rec = p[3]                # [AST_identificador | AST_identificador_objeto] | [AST_skippeable]
   identificador = aplicarModificador(identificador, opt_mod)
-  if len(rec) > 0 and isinstance(rec[0], AST_asignable):
-    rec.insert(0, identificador)
+  # La lista de parámetros se arma al revés y se da vuelta en p_parametros
+  if len(rec) > 0 and isinstance(rec[-1], AST_asignable):
+    rec.append(identificador)
   else:
     identificador.clausura(rec)
     rec = [identificador]
@@ -467,7 +783,7 @@ def p_identificadores_parametros_primer_identificador(p): # [AST_identificador |
 
 def p_mas_identificadores_parametros_fin(p): # [AST_skippeable]
   '''
-  mas_identificadores_parametros : vacio
+  mas_identificadores_parametros : %prec VACIO
   '''
   p[0] = []
 
@@ -483,9 +799,9 @@ def p_mas_identificadores_parametros_no_vacio(p): # [AST_identificador | AST_ide
   '''
   coma = AST_sintaxis(p[1])
   s = concatenar(coma, p[2])  # [AST_skippeable]
-  rec = p[3]                  # [AST_identificador | AST_identificador_objeto] | [AST_skippeable]
-  if len(rec) > 0 and isinstance(rec[0], AST_asignable):
-    rec[0].apertura(s)
+  rec = p[3]                  # [AST_identificador | AST_identificador_objeto] (al revés) | [AST_skippeable]
+  if len(rec) > 0 and isinstance(rec[-1], AST_asignable):
+    rec[-1].apertura(s)
   else:
     rec = concatenar(s, rec)
   p[0] = rec
@@ -535,9 +851,9 @@ def p_nombre_parametro_sin_prefijo(p): # AST_identificador
 
 def p_mas_identificadores_o_modificadores_parametro_vacio(p): # [AST_skippeable]
   '''
-  opt_mas_identificadores_o_modificadores_parametro : vacio
+  opt_mas_identificadores_o_modificadores_parametro : %prec VACIO
   '''
-  p[0] = p[1]
+  p[0] = []
 
 def p_mas_identificadores_o_modificadores_parametro_no_vacio(p): # AST_identificador | AST_identificadores | AST_identificador_objeto
   '''
@@ -613,13 +929,13 @@ def p_campo_parametro_con_valor(p): # AST_expresion
 
 def p_campo_parametro_sin_valor(p): # [AST_skippeable]
   '''
-  opt_valor_campo_parametro : vacio
+  opt_valor_campo_parametro : %prec VACIO
   '''
-  p[0] = p[1]
+  p[0] = []
 
 def p_identificadores_vacio(p): # [AST_identificador]
   '''
-  identificadores : vacio
+  identificadores : %prec VACIO
   '''
   p[0] = []
 
@@ -663,7 +979,7 @@ def p_identificadores_primer_identificador(p): # [AST_identificador]
 
 def p_mas_identificadores_fin(p): # [AST_skippeable]
   '''
-  mas_identificadores : vacio
+  mas_identificadores : %prec VACIO
   '''
   p[0] = []
 
@@ -711,9 +1027,9 @@ def p_opt_is_si(p): # AST_decorador_tipo
 
 def p_opt_is_no(p): # AST_decorador_tipo
   '''
-  opt_is : vacio
+  opt_is : %prec VACIO
   '''
-  p[0] = p[1]
+  p[0] = []
 
 def p_tipo_identificador(p): # AST_tipo
   '''
@@ -1035,9 +1351,9 @@ def p_campo_tipo(p): # AST_campo_tipo
 
 def p_opt_pregunta_vacio(p):
   '''
-  opt_pregunta : vacio
+  opt_pregunta : %prec VACIO
   '''
-  p[0] = p[1]
+  p[0] = []
 
 def p_opt_pregunta_no_vacio(p):
   '''
@@ -1134,9 +1450,9 @@ def p_identificador_con_corchetes(p): # AST_identificadores
 
 def p_mas_variables_vacio(p): # [AST_skippeable]
   '''
-  opt_mas_variables : vacio
+  opt_mas_variables : %prec VACIO
   '''
-  p[0] = p[1]
+  p[0] = []
 
 def p_mas_variables_no_vacio(p): # AST_modificador_variable_adicional
   '''
@@ -1409,7 +1725,7 @@ def p_expresion_o_parametros_identificador(p): # AST_identificador | AST_paramet
     resultado.primerParametro(identificador)
   elif isinstance(continuacion, AST_decorador):
     opt_adicional = continuacion.adicional
-    continuacion.adicional = []
+    continuacion.adicional = VACIO
     resultado = aplicarModificador(resultado, continuacion)
     if len(opt_adicional) == 1: # tiene que ser [AST_identificador]
       lista = opt_adicional[0]
@@ -1430,15 +1746,15 @@ def p_expresion_o_parametros_expresion_suelta(p): # AST_expresion
 
 def p_expresion_o_parametros_vacio(p): # AST_parametros
   '''
-  expresion_o_parametros : vacio
+  expresion_o_parametros : %prec VACIO
   '''
   p[0] = AST_parametros([])
 
 def p_opt_continuacion_expresion_o_parametros_vacio(p): # [AST_skippeable]
   '''
-  opt_continuacion_expresion_o_parametros : vacio
+  opt_continuacion_expresion_o_parametros : %prec VACIO
   '''
-  p[0] = p[1]
+  p[0] = []
 
 def p_opt_continuacion_expresion_o_parametros_parametros(p): # AST_parametros
   '''
@@ -1578,9 +1894,9 @@ def p_opt_invocacion_si(p): # AST_argumentos
 
 def p_opt_invocacion_no(p): # [AST_skippeable]
   '''
-  opt_invocacion : vacio
+  opt_invocacion : %prec VACIO
   '''
-  p[0] = p[1]
+  p[0] = []
 
 def p_expresion_objeto(p): # AST_expresion_objeto
   '''
@@ -2064,7 +2380,7 @@ def p_lista_literal(p): # AST_expresion_lista
   s = concatenar(abre, p[2])              # [AST_skippeable]
   elementos = p[3]                        # AST_elementos
   modificadores = elementos.adicional     # [AST_modificador]
-  elementos.adicional = []
+  elementos.adicional = VACIO
   lista = AST_expresion_lista(elementos)
   lista.apertura(s)
   for m in modificadores:
@@ -2182,9 +2498,9 @@ def p_campo_con_valor(p): # AST_expresion
 
 def p_campo_sin_valor(p): # [AST_skippeable]
   '''
-  opt_valor_campo : vacio
+  opt_valor_campo : %prec VACIO
   '''
-  p[0] = p[1]
+  p[0] = []
 
 def p_clave_campo_identificador_con_prefijo(p): # AST_expresion | AST_identificador | AST_declaracion_funcion | ¿AST_invocacion?
   '''
@@ -2226,9 +2542,9 @@ def p_opt_definicion_funcion_si(p): # AST_funcion_incompleta | AST_invocacion
 
 def p_opt_definicion_funcion_no(p): # [AST_skippeable]
   '''
-  opt_definicion_funcion : vacio
+  opt_definicion_funcion : %prec VACIO
   '''
-  p[0] = p[1]
+  p[0] = []
 
 def p_clave_campo_literal(p): # AST_expresion_literal
   '''
@@ -2303,9 +2619,9 @@ def p_cuerpo_combinador_sin_llaves(p): # AST_cuerpo
 
 def p_opt_cuerpo_vacio(p): # [AST_skippeable]
   '''
-  opt_cuerpo : vacio
+  opt_cuerpo : %prec VACIO
   '''
-  p[0] = p[1]
+  p[0] = []
 
 def p_opt_cuerpo_cuerpo(p): # AST_cuerpo
   '''
@@ -2371,9 +2687,9 @@ def p_opt_guarda_si(p):
 
 def p_opt_guarda_no(p):
   '''
-  opt_guarda : vacio
+  opt_guarda : %prec VACIO
   '''
-  p[0] = p[1]
+  p[0] = []
 
 def p_selector_combinador_else(p): # AST_combinador
   '''
@@ -2392,7 +2708,7 @@ def p_opt_if(p): # AST_combinador | [AST_skippeable]
   '''
   opt_if : selector_combinador
          | sf opt_if
-         | vacio
+         | %prec VACIO
   '''
   p[0] = modificador_opcional(p)
 
@@ -2487,9 +2803,9 @@ def p_opt_expresion_expresion(p):
 
 def p_opt_expresion_nada(p):
   '''
-  opt_expresion : vacio
+  opt_expresion : %prec VACIO
   '''
-  p[0] = p[1]
+  p[0] = []
 
 # DECLARACIÓN : CORTE_CICLO (break | continue)
  #################################################################################################
@@ -2539,9 +2855,9 @@ def p_import_elementos(p): # AST_import
 
 def p_opt_type_vacio(p): # [AST_skippeable]
   '''
-  opt_type : vacio
+  opt_type : %prec VACIO
   '''
-  p[0] = p[1]
+  p[0] = []
 
 def p_opt_type_tipo(p): # AST_sintaxis
   '''
@@ -2577,7 +2893,7 @@ def p_import_como_alias(p): # AST_identificador
 
 def p_import_como_vacio(p): # [AST_skippeable]
   '''
-  opt_importar_como : vacio
+  opt_importar_como : %prec VACIO
   '''
   p[0] = []
 
@@ -2680,9 +2996,9 @@ def p_declaracion_de_tipo(p): # AST_declaracion_tipo | AST_identificador | AST_i
 
 def p_continuacion_type_en_declaracion_vacio(p): # AST_TMP ( vacio )
   '''
-  continuacion_type_en_declaracion : vacio
+  continuacion_type_en_declaracion : %prec VACIO
   '''
-  p[0] = AST_TMP("vacio", p[1])
+  p[0] = AST_TMP("vacio", [])
 
 def p_continuacion_type_en_declaracion_sigue_id(p): # AST_TMP ( nombre ) ; ( tipo | modificador | mas_ids )
   '''
@@ -2870,17 +3186,21 @@ def p_programa_clase_que_no_empieza_con_skip(p):
   '''
   programa_clase : programa_clase_util
   '''
-  p[0] = p[1]
+  declaraciones = p[1]  # [AST_nodo] (al revés)
+  declaraciones.reverse()
+  p[0] = declaraciones
 
 def p_programa_clase_que_empieza_con_skip(p):
   '''
   programa_clase : sf programa_clase_util
   '''
-  p[0] = concatenar(p[1], p[2])
+  declaraciones = p[2]  # [AST_nodo] (al revés)
+  declaraciones.reverse()
+  p[0] = concatenar(materializar(p[1]), declaraciones)
 
 def p_programa_clase_util_vacio(p):
   '''
-  programa_clase_util : vacio
+  programa_clase_util : %prec VACIO
   '''
   p[0] = []
 
@@ -2888,11 +3208,14 @@ def p_programa_clase_util_no_vacio(p):
   '''
   programa_clase_util : declaracion_dentro_de_clase opt_cierre programa_clase_util
   '''
+  # La lista se arma al revés (cada declaración se agrega al final) y se da
+  # vuelta en programa_clase
   declaracion = p[1]
   cierre = p[2]
   rec = p[3]
   declaracion.clausura(cierre)
-  p[0] = concatenar(declaracion, rec)
+  rec.append(declaracion)
+  p[0] = rec
 
 def p_declaracion_dentro_de_clase_con_pre(p): # AST_declaracion
   '''
@@ -3028,9 +3351,9 @@ def p_identificador_con_modificadores_pre(p): # AST_identificador | AST_identifi
 
 def p_mas_identificadores_o_modificadores_vacio(p): # [AST_skippeable]
   '''
-  opt_mas_identificadores_o_modificadores : vacio
+  opt_mas_identificadores_o_modificadores : %prec VACIO
   '''
-  p[0] = p[1]
+  p[0] = []
 
 def p_mas_identificadores_o_modificadores_no_vacio(p): # AST_identificador | AST_identificadores
   '''
@@ -3061,9 +3384,9 @@ def p_id_clases_coma(p): # AST_tipo_varios
 
 def p_opt_mas_ids_clase_coma_ninguna(p): # [AST_skippeable]
   '''
-  opt_mas_ids_clase_coma : vacio
+  opt_mas_ids_clase_coma : %prec VACIO
   '''
-  p[0] = p[1]
+  p[0] = []
 
 def p_opt_mas_ids_clase_coma_otra(p): # AST_tipo_varios
   '''
@@ -3092,9 +3415,9 @@ def p_id_clases_and(p): # AST_tipo_varios
 
 def p_opt_mas_ids_clase_and_ninguna(p): # [AST_skippeable]
   '''
-  opt_mas_ids_clase_and : vacio
+  opt_mas_ids_clase_and : %prec VACIO
   '''
-  p[0] = p[1]
+  p[0] = []
 
 def p_opt_mas_ids_clase_and_otra(p): # AST_tipo_varios
   '''
@@ -3108,7 +3431,7 @@ def p_opt_mas_ids_clase_and_otra(p): # AST_tipo_varios
 
 def p_tipos_fin(p): # AST_tipo_tupla
   '''
-  tipos : vacio
+  tipos : %prec VACIO
   '''
   p[0] = AST_tipo_tupla([])
 
@@ -3125,7 +3448,7 @@ def p_tipos_tipo(p): # AST_tipo_tupla
 
 def p_mas_tipos_fin(p): # AST_tipo_tupla
   '''
-  mas_tipos : vacio
+  mas_tipos : %prec VACIO
   '''
   p[0] = AST_tipo_tupla([])
 
@@ -3149,11 +3472,9 @@ def p_cierre(p): # [AST_skippeable]
 
 def p_salto(p): # [AST_skippeable]
   '''
-  salto : SALTO s
+  salto : SALTO corrida
   '''
-  salto = AST_salto(p[1])
-  cierre = p[2]                       # [AST_skippeable]
-  p[0] = concatenar(salto, cierre)
+  p[0] = cerrarCorrida(p[1], p[2])
 
 def p_separador(p): # [AST_skippeable]
   '''
@@ -3164,11 +3485,9 @@ def p_separador(p): # [AST_skippeable]
 
 def p_espacios(p): # [AST_skippeable]
   '''
-  espacios : ESPACIO s
+  espacios : ESPACIO corrida
   '''
-  espacios = AST_espacios(p[1])
-  cierre = p[2]                       # [AST_skippeable]
-  p[0] = concatenar(espacios, cierre)
+  p[0] = cerrarCorrida(p[1], p[2])
 
 def p_opt_cierre_con_skip(p): # [AST_skippeable]
   '''
@@ -3184,12 +3503,8 @@ def p_opt_cierre_sin_skip(p): # [AST_skippeable]
 
 def p_opt_cierre_nada(p): # [AST_skippeable]
   '''
-  opt_cierre : vacio
+  opt_cierre : %prec VACIO
   '''
-  p[0] = p[1]
-
-def p_vacio(p): # [AST_skippeable]
-  'vacio : %prec VACIO'
   p[0] = []
 
 ## == MODIFICADORES == ##
@@ -3198,7 +3513,7 @@ def p_opt_modificador_clave_campo(p): # ... | [AST_skippeable]
   '''
   opt_modificador_clave_campo : modificador_clave_campo
                               | sf opt_modificador_clave_campo
-                              | vacio
+                              | %prec VACIO
   '''
   p[0] = modificador_opcional(p)
 def p_modificador_clave_campo(p): # AST_funcion_incompleta | AST_invocacion | AST_modificador_objeto_acceso
@@ -3216,7 +3531,7 @@ def p_opt_modificador_id_clase(p): # ... | [AST_skippeable]
   '''
   opt_modificador_id_clase : modificador_id_clase
                            | sf opt_modificador_id_clase
-                           | vacio
+                           | %prec VACIO
   '''
   p[0] = modificador_opcional(p)
 def p_modificador_id_clase(p): # AST_tipo_tupla
@@ -3230,7 +3545,7 @@ def p_opt_modificador_dentro_de_clase(p): # ... | [AST_skippeable]
   '''
   opt_modificador_dentro_de_clase : modificador_dentro_de_clase
                                   | sf opt_modificador_dentro_de_clase
-                                  | vacio
+                                  | %prec VACIO
   '''
   p[0] = modificador_opcional(p)
 def p_modificador_dentro_de_clase(p): # AST_modificador_objeto | AST_expresion_funcion
@@ -3248,7 +3563,7 @@ def p_opt_modificador_clase(p): # ... | [AST_skippeable]
   '''
   opt_modificador_clase : modificador_clase
                         | sf opt_modificador_clase
-                        | vacio
+                        | %prec VACIO
   '''
   p[0] = modificador_opcional(p)
 def p_modificador_clase(p): # AST_decorador_implementacion | AST_decorador_extension
@@ -3265,7 +3580,7 @@ def p_opt_modificador_identificador(p): # ... | [AST_skippeable]
   '''
   opt_modificador_identificador : modificador_identificador
                                 | sf opt_modificador_identificador
-                                | vacio
+                                | %prec VACIO
   '''
   p[0] = modificador_opcional(p)
 def p_modificador_identificador(p): # AST_modificador_asignacion
@@ -3279,7 +3594,7 @@ def p_opt_modificador_expresion(p): # ... | [AST_skippeable]
   '''
   opt_modificador_expresion : modificador_expresion
                             | sf opt_modificador_expresion
-                            | vacio
+                            | %prec VACIO
   '''
   p[0] = modificador_opcional(p)
 def p_modificador_expresion(p): # AST_modificador_objeto | AST_argumentos | AST_modificador_operador | AST_cuerpo | AST_tipo_void | AST_decorador_tipo
@@ -3300,7 +3615,7 @@ def p_opt_modificador_expresion_no_tipada(p): # ... | [AST_skippeable]
   '''
   opt_modificador_expresion_no_tipada : modificador_expresion_no_tipada
                                       | sf opt_modificador_expresion_no_tipada
-                                      | vacio
+                                      | %prec VACIO
   '''
   p[0] = modificador_opcional(p)
 def p_modificador_expresion_no_tipada(p): # AST_modificador_objeto | AST_argumentos | AST_modificador_operador | AST_cuerpo | AST_tipo_void
@@ -3317,7 +3632,7 @@ def p_opt_modificador_expresion_asignada(p): # ... | [AST_skippeable]
   '''
   opt_modificador_expresion_asignada : modificador_expresion_asignada
                                      | sf opt_modificador_expresion_asignada
-                                     | vacio
+                                     | %prec VACIO
   '''
   p[0] = modificador_opcional(p)
 def p_modificador_expresion_asignada_acceso(p): # AST_modificador_objeto | AST_tipo_lista | AST_argumentos | AST_modificador_operador | AST_decorador_comotipo | AST_cuerpo | AST_tipo_void
@@ -3339,7 +3654,7 @@ def p_opt_modificador_asignable(p): # ... | [AST_skippeable]
   '''
   opt_modificador_asignable : modificador_asignable
                             | sf opt_modificador_asignable
-                            | vacio
+                            | %prec VACIO
   '''
   p[0] = modificador_opcional(p)
 def p_modificador_asignable(p): # AST_modificador_asignacion | AST_modificador_objeto | AST_tipo_lista | AST_argumentos | AST_decorador_comotipo | AST_modificador_operador
@@ -3361,7 +3676,7 @@ def p_opt_modificador_asignable_no_tipado(p): # ... | [AST_skippeable]
   '''
   opt_modificador_asignable_no_tipado : modificador_asignable_no_tipado
                                       | sf opt_modificador_asignable_no_tipado
-                                      | vacio
+                                      | %prec VACIO
   '''
   p[0] = modificador_opcional(p)
 def p_modificador_asignable_no_tipado(p): # AST_modificador_asignacion | AST_modificador_objeto | AST_tipo_lista | AST_argumentos | AST_decorador_comotipo | AST_modificador_operador
@@ -3383,7 +3698,7 @@ def p_opt_modificador_objeto_expresion(p): # ... | [AST_skippeable]
   '''
   opt_modificador_objeto_expresion : modificador_objeto_expresion
                                    | sf opt_modificador_objeto_expresion
-                                   | vacio
+                                   | %prec VACIO
   '''
   p[0] = modificador_opcional(p)
 def p_modificador_objeto_expresion(p): # AST_modificador_asignacion | AST_modificador_objeto | AST_tipo_lista | AST_decorador_comotipo
@@ -3403,7 +3718,7 @@ def p_opt_modificador_variable(p): # ... | [AST_skippeable]
   '''
   opt_modificador_variable : modificador_variable
                            | sf opt_modificador_variable
-                           | vacio
+                           | %prec VACIO
   '''
   p[0] = modificador_opcional(p)
 def p_modificador_variable(p): # AST_modificador_asignacion | AST_iterador | AST_modificador_variable_adicional
@@ -3422,7 +3737,7 @@ def p_opt_modificador_tipo(p): # ... | [AST_skippeable]
   '''
   opt_modificador_tipo : modificador_tipo
                        | sf opt_modificador_tipo
-                       | vacio
+                       | %prec VACIO
   '''
   p[0] = modificador_opcional(p)
 def p_modificador_tipo(p): # AST_tipo_tupla | AST_tipo_lista | AST_tipo_suma | AST_modificador_objeto_acceso
@@ -3443,7 +3758,7 @@ def p_opt_decorador_declaracion_clase(p): # ... | [AST_skippeable]
   '''
   opt_decorador_declaracion_clase : decorador_declaracion_clase
                                   | sf opt_decorador_declaracion_clase
-                                  | vacio
+                                  | %prec VACIO
   '''
   p[0] = modificador_opcional(p)
 def p_decorador_declaracion_clase(p): # AST_decorador_opcional | AST_decorador_tipo
@@ -3459,7 +3774,7 @@ def p_opt_decorador_parametro(p): # ... | [AST_skippeable]
   '''
   opt_decorador_parametro : decorador_parametro
                           | sf opt_decorador_parametro
-                          | vacio
+                          | %prec VACIO
   '''
   p[0] = modificador_opcional(p)
 def p_decorador_parametro(p): # AST_decorador_comotipo | AST_decorador_default | AST_decorador_opcional | AST_decorador_tipo
@@ -3480,7 +3795,7 @@ def p_opt_decorador_tipo(p): # AST_decorador_tipo | [AST_skippeable]
   '''
   opt_decorador_tipo : decorador_tipo
                      | sf opt_decorador_tipo
-                     | vacio
+                     | %prec VACIO
   '''
   p[0] = modificador_opcional(p)
 
@@ -3488,7 +3803,7 @@ def p_opt_modificador_funcion(p): # ... | [AST_skippeable]
   '''
   opt_modificador_funcion : modificador_funcion
                           | sf opt_modificador_funcion
-                          | vacio
+                          | %prec VACIO
   '''
   p[0] = modificador_opcional(p)
 def p_modificador_funcion(p): # AST_argumentos | AST_modificador_asignacion | AST_modificador_objeto | AST_tipo_lista | AST_decorador_comotipo
@@ -3533,9 +3848,9 @@ def p_opt_modificador_extend_and_default(p): # AST_decorador_default
 
 def p_opt_modificador_extend_and_vacio(p): # [AST_skippeable]
   '''
-  opt_modificador_extend_and : vacio
+  opt_modificador_extend_and : %prec VACIO
   '''
-  p[0] = p[1]
+  p[0] = []
 
 ## == Q == ##
 
@@ -3772,6 +4087,8 @@ def p_decorador_default(p): # AST_decorador_default
   p[0] = AST_decorador_default(expresion)
 
 def modificador_opcional(p):
+  if len(p) == 1: # vacío
+    return []
   resultado = p[1]
   if len(p) == 3:
     if isinstance(p[2], AST_nodo):
@@ -3781,12 +4098,105 @@ def modificador_opcional(p):
       resultado = concatenar(p[1], p[2])
   return resultado
 
+# La mayoría de las listas de un nodo (espacios, decoradores, modificadores
+# adicionales, ...) quedan vacías. Hasta que hace falta agregarles algo todas
+# apuntan a esta lista vacía compartida, que es una tupla para que nadie la
+# modifique por error.
+VACIO = ()
+
+def unirListas(a, b):
+  # a + b, con a y b listas o VACIO
+  if len(a) == 0 and len(b) == 0:
+    return VACIO
+  return [*a, *b]
+
+class ListaAlReves(object):
+  # Las listas que la gramática arma de atrás para adelante (los campos de un
+  # objeto, los argumentos de una invocación, los tipos de una unión, ...). Lo
+  # que se agrega adelante mientras se arma el nodo se guarda invertido en otra
+  # lista, así cada elemento es un append y no un insert(0). La gramática sólo
+  # usa agregarAdelante, primero y cantidad; la primera vez que se lee la lista
+  # (el nodo ya está terminado) cerrar da vuelta esa lista una sola vez y la pega
+  # adelante. Desde ahí previos queda en None, agregarAdelante inserta
+  # directamente y cada lectura devuelve la misma lista, que se puede modificar.
+  # La clase declara los slots _<nombre> y _<nombre>_previos.
+  def __set_name__(self, clase, nombre):
+    self.lista = getattr(clase, '_' + nombre)
+    self.previos = getattr(clase, '_' + nombre + '_previos')
+  def __get__(self, nodo, clase=None):
+    if nodo is None:
+      return self
+    if self.previos.__get__(nodo) is not None:
+      self.cerrar(nodo)
+    return self.lista.__get__(nodo)
+  def __set__(self, nodo, lista):
+    if nodo.inicio is not None:
+      nodo.modificado()
+    try:
+      cerrada = self.previos.__get__(nodo) is None
+    except AttributeError: # Desde el __init__ del nodo
+      cerrada = False
+    self.lista.__set__(nodo, lista)
+    self.previos.__set__(nodo, None if cerrada else VACIO)
+  def cerrar(self, nodo):
+    previos = self.previos.__get__(nodo)
+    if previos is None:
+      return
+    if len(previos) > 0:
+      previos.reverse()
+      self.lista.__get__(nodo)[:0] = previos
+    self.previos.__set__(nodo, None)
+  def agregarAdelante(self, nodo, x):
+    if nodo.inicio is not None:
+      nodo.modificado()
+    previos = self.previos.__get__(nodo)
+    if previos is None:
+      self.lista.__get__(nodo).insert(0, x)
+      return
+    if previos is VACIO:
+      previos = []
+      self.previos.__set__(nodo, previos)
+    previos.append(x)
+  def primero(self, nodo):
+    # Sin copiar la lista (se sigue armando)
+    previos = self.previos.__get__(nodo)
+    if previos:
+      return previos[-1]
+    return self.lista.__get__(nodo)[0]
+  def cantidad(self, nodo):
+    previos = self.previos.__get__(nodo)
+    return len(self.lista.__get__(nodo)) + (0 if previos is None else len(previos))
+
+class Posiciones(object):
+  # Lo comparten los nodos de un árbol al que se le asignaron posiciones (ver
+  # asignarPosiciones). Si después se modifica uno de ellos, puede haber texto
+  # nuevo adentro de los que lo contienen y sus posiciones en el código fuente
+  # ya no sirven. Hay uno por árbol: modificar un árbol no afecta a los otros.
+  __slots__ = ('vigentes',)
+  def __init__(self):
+    self.vigentes = True
+
 class AST_nodo(object):
+  # Todas las clases del AST declaran __slots__ con sus campos
+  __slots__ = ('cierra', 'abre', 'decoradores_pre', 'decoradores', 'inicio', 'fin', 'posiciones')
   def __init__(self):
-    self.cierra = []
-    self.abre = []
-    self.decoradores_pre = []
-    self.decoradores = []
+    self.cierra = VACIO
+    self.abre = VACIO
+    self.decoradores_pre = VACIO
+    self.decoradores = VACIO
+    self.inicio = None  # Posición en el código fuente (ver asignarPosiciones)
+    self.fin = None
+    # posiciones se asigna junto con la posición (ver asignarPosiciones)
+  @property
+  def span(self):
+    return (self.inicio, self.fin)
+  def modificado(self):
+    # Lo llaman los métodos que cambian el código de un nodo que ya tiene
+    # posición: la suya deja de valer, y la de los nodos que lo contienen
+    # también, lo que restore con el código fuente detecta con posiciones
+    self.posiciones.vigentes = False
+    self.inicio = None
+    self.fin = None
   def imitarEspaciosYDecoradores(self, otro):
     self.imitarDecoradores(otro)
     self.imitarEspacios(otro)
@@ -3800,90 +4210,146 @@ class AST_nodo(object):
     for decorador in otro.decoradores:
       self.agregar_decorador(decorador)
   def anularEspacios(self):
-    self.abre = []
-    self.cierra = []
+    if self.inicio is not None:
+      self.modificado()
+    self.abre = VACIO
+    self.cierra = VACIO
   def imitarEspacios(self, otro):
     self.imitarEspaciosA(otro)
     self.imitarEspaciosC(otro)
   def imitarEspaciosA(self, otro):
-    self.abre = otro.abre + self.abre
+    if self.inicio is not None:
+      self.modificado()
+    self.abre = unirListas(otro.abre, self.abre)
   def imitarEspaciosC(self, otro):
-    self.cierra = self.cierra + otro.cierra
+    if self.inicio is not None:
+      self.modificado()
+    self.cierra = unirListas(self.cierra, otro.cierra)
   def agregar_decorador_pre(self, decorador):
+    if self.inicio is not None:
+      self.modificado()
     decorador.clausura(self.abre)
-    self.abre = []
+    self.abre = VACIO
+    if self.decoradores_pre is VACIO:
+      self.decoradores_pre = []
     self.decoradores_pre.insert(0, decorador)
   def agregar_decorador(self, decorador):
+    if self.inicio is not None:
+      self.modificado()
     decorador.apertura(self.cierra)
-    self.cierra = []
+    self.cierra = VACIO
+    if self.decoradores is VACIO:
+      self.decoradores = []
     self.decoradores.append(decorador)
   def apertura(self, c):
-    if c is None:
+    if c is None or c is VACIO:
       return
+    if self.inicio is not None:
+      self.modificado()
     if type(c) != type([]):
       c = [c]
-    for x in reversed(c):
-      self.abre.insert(0, x)
+    self.abre = unirListas(c, self.abre)
   def clausura(self, c):
-    if c is None:
+    if c is None or c is VACIO:
       return
+    if self.inicio is not None:
+      self.modificado()
     if type(c) != type([]):
       c = [c]
+    if self.cierra is VACIO:
+      self.cierra = []
     for x in c:
       self.cierra.append(x)
-  def restore(self,contenido=''):
-    return f"{''.join(map(restore, self.abre))}{''.join(map(restore, self.decoradores_pre))}{contenido}{''.join(map(restore, self.decoradores))}{''.join(map(restore, self.cierra))}"
+  def descripcion(self):
+    # Lo que muestra str(nodo), en orden: strings tal cual y Mostrar(x) para lo
+    # que se muestra con show
+    return [object.__repr__(self)]
+  def __str__(self):
+    partes = []
+    for parte in self.descripcion():
+      partes.append(show(parte.x) if type(parte) is Mostrar else parte)
+    return ''.join(partes)
+  def fragmentos(self):
+    # Lo que forma el código propio del nodo, en orden (strings, nodos, listas o None)
+    return []
+  def partes(self):
+    # Todo el código del nodo, en orden: el propio rodeado de espacios y decoradores
+    return [self.abre, self.decoradores_pre, *self.fragmentos(), self.decoradores, self.cierra]
+  def restore_into(self, escribir, fuente=None):
+    restore_into(self, escribir, fuente)
+  def restore(self, fuente=None):
+    return restore(self, fuente)
 
 class AST_skippeable(AST_nodo):
+  __slots__ = ()
   def __init__(self):
     super().__init__()
 
 class AST_espacios(AST_skippeable):
+  __slots__ = ('espacios',)
   def __init__(self, espacios):
     super().__init__()
     self.espacios = espacios
-  def __str__(self):
-    return show(self.espacios)
-  def restore(self):
-    return super().restore(f"{self.espacios}")
+  def descripcion(self):
+    return [Mostrar(self.espacios)]
+  def fragmentos(self):
+    return [self.espacios]
 
 class AST_salto(AST_skippeable):
+  __slots__ = ('espacios',)
   def __init__(self, espacios):
     super().__init__()
     self.espacios = espacios
-  def __str__(self):
-    return show(self.espacios)
-  def restore(self):
-    return super().restore(f"{self.espacios}")
+  def descripcion(self):
+    return [Mostrar(self.espacios)]
+  def fragmentos(self):
+    return [self.espacios]
 
 class AST_comentario(AST_skippeable):
+  __slots__ = ('contenido',)
   def __init__(self, contenido):
     super().__init__()
     self.contenido = contenido
-  def __str__(self):
-    return f"Comentario: {show(self.contenido)}"
-  def restore(self):
-    return super().restore(f"{self.contenido}")
+  def descripcion(self):
+    return ["Comentario: ", Mostrar(self.contenido)]
+  def fragmentos(self):
+    return [self.contenido]
 
 class AST_sintaxis(AST_skippeable):
+  __slots__ = ('contenido',)
   def __init__(self, contenido):
     super().__init__()
     self.contenido = contenido
-  def __str__(self):
-    return f"Sintaxis: {show(self.contenido)}"
-  def restore(self):
-    return super().restore(f"{self.contenido}")
+  def descripcion(self):
+    return ["Sintaxis: ", Mostrar(self.contenido)]
+  def fragmentos(self):
+    return [self.contenido]
 
 class AST_declaracion(AST_nodo):
+  __slots__ = ()
   def __init__(self):
     super().__init__()
 
+class AST_error(AST_declaracion):
+  __slots__ = ('texto',)
+  # Texto que se salteó al recuperarse de un error de sintaxis
+  def __init__(self, texto):
+    super().__init__()
+    self.texto = texto
+  def descripcion(self):
+    return ["Error: ", Mostrar(self.texto)]
+  def fragmentos(self):
+    return [self.texto]
+
 class AST_modificador(AST_nodo):
+  __slots__ = ('adicional',)
   def __init__(self):
     super().__init__()
-    self.adicional = []
+    self.adicional = VACIO
   def modificador_adicional(self, otro):
     if isinstance(otro, AST_nodo):
+      if self.adicional is VACIO:
+        self.adicional = []
       self.adicional.append(otro)
     elif len(self.adicional) > 0:
       self.adicional[-1].clausura(otro)
@@ -3891,119 +4357,136 @@ class AST_modificador(AST_nodo):
       self.clausura(otro)
 
 class AST_declaracion_funcion(AST_declaracion):
+  __slots__ = ('nombre', 'parametros', 'cuerpo')
   def __init__(self, nombre, funcion_incompleta):
     super().__init__()
     self.nombre = nombre                                    # AST_identificador
     self.parametros = funcion_incompleta.parametros         # AST_parametros
     self.cuerpo = funcion_incompleta.cuerpo                 # AST_cuerpo
     self.imitarEspaciosYDecoradores(funcion_incompleta)
-  def __str__(self):
-    return f"DeclaraciónFunción : {show(self.nombre)}"
-  def restore(self):
-    return super().restore(f"{restore(self.nombre)}{restore(self.parametros)}{restore(self.cuerpo)}")
+  def descripcion(self):
+    return ["DeclaraciónFunción : ", Mostrar(self.nombre)]
+  def fragmentos(self):
+    return [self.nombre, self.parametros, self.cuerpo]
 
 class AST_declaracion_clase(AST_declaracion):
+  __slots__ = ('nombre', 'definicion')
   def __init__(self, nombre, definicion):
     super().__init__()
     self.nombre = nombre            # AST_tipo
     self.definicion = definicion    # AST_cuerpo
-  def __str__(self):
-    return f"Declaración clase : {show(self.nombre)}"
-  def restore(self):
-    return super().restore(f"{restore(self.nombre)}{restore(self.definicion)}")
+  def descripcion(self):
+    return ["Declaración clase : ", Mostrar(self.nombre)]
+  def fragmentos(self):
+    return [self.nombre, self.definicion]
 
 class AST_declaracion_tipo(AST_declaracion):
+  __slots__ = ('nombre', 'definicion')
   def __init__(self, nombre, definicion):
     super().__init__()
     self.nombre = nombre            # AST_tipo
     self.definicion = definicion    # AST_tipo
-  def __str__(self):
-    return f"Declaración tipo : {show(self.nombre)}"
-  def restore(self):
-    return super().restore(f"{restore(self.nombre)}{restore(self.definicion)}")
+  def descripcion(self):
+    return ["Declaración tipo : ", Mostrar(self.nombre)]
+  def fragmentos(self):
+    return [self.nombre, self.definicion]
 
 class AST_cuerpo(AST_modificador):
+  __slots__ = ('contenido',)
   def __init__(self, contenido):
     super().__init__()
     self.contenido = contenido    # [AST_nodo]
-  def __str__(self):
-    return show(self.contenido)
-  def restore(self):
-    return super().restore(''.join(map(restore, self.contenido)))
+  def descripcion(self):
+    return [Mostrar(self.contenido)]
+  def fragmentos(self):
+    return [self.contenido]
 
 class AST_expresion(AST_declaracion):
+  __slots__ = ()
   def __init__(self):
     super().__init__()
 
 class AST_expresion_literal(AST_expresion):
+  __slots__ = ('literal',)
   def __init__(self, literal):
     super().__init__()
     self.literal = literal        # String
-  def __str__(self):
-    return f"{show(self.literal)}"
-  def restore(self):
-    return super().restore(f"{restore(self.literal)}")
+  def descripcion(self):
+    return [Mostrar(self.literal)]
+  def fragmentos(self):
+    return [self.literal]
 
 class AST_expresion_objeto(AST_expresion):
+  __slots__ = ('campos',)
   def __init__(self, campos):
     super().__init__()
     self.campos = campos        # AST_campos
-  def __str__(self):
-    return f"Objeto : {show(self.campos)}"
-  def restore(self):
-    return super().restore(f"{restore(self.campos)}")
+  def descripcion(self):
+    return ["Objeto : ", Mostrar(self.campos)]
+  def fragmentos(self):
+    return [self.campos]
 
 class AST_expresion_lista(AST_expresion):
+  __slots__ = ('elementos',)
   def __init__(self, elementos):
     super().__init__()
     self.elementos = elementos        # AST_elementos
-  def __str__(self):
-    return f"Objeto : {show(self.elementos)}"
-  def restore(self):
-    return super().restore(f"{restore(self.elementos)}")
+  def descripcion(self):
+    return ["Objeto : ", Mostrar(self.elementos)]
+  def fragmentos(self):
+    return [self.elementos]
 
 class AST_expresion_identificador(AST_expresion):
+  __slots__ = ('identificador',)
   def __init__(self, identificador):
     super().__init__()
     self.identificador = identificador    # AST_identificador
-  def __str__(self):
-    return f"{show(self.identificador)}"
-  def restore(self):
-    return super().restore(f"{restore(self.identificador)}")
+  def descripcion(self):
+    return [Mostrar(self.identificador)]
+  def fragmentos(self):
+    return [self.identificador]
 
 class AST_expresion_funcion(AST_expresion):
+  __slots__ = ('parametros', 'cuerpo')
   def __init__(self, funcion_incompleta):
     super().__init__()
     self.parametros = funcion_incompleta.parametros     # AST_parametros
     self.cuerpo = funcion_incompleta.cuerpo             # AST_cuerpo
     self.imitarEspaciosYDecoradores(funcion_incompleta)
-  def __str__(self):
-    return f"FunciónAnónima {show(self.cuerpo)}"
-  def restore(self):
-    return super().restore(f"{restore(self.parametros)}{restore(self.cuerpo)}")
+  def descripcion(self):
+    return ["FunciónAnónima ", Mostrar(self.cuerpo)]
+  def fragmentos(self):
+    return [self.parametros, self.cuerpo]
 
 class AST_declaracion_variable(AST_declaracion):
+  __slots__ = ('nombre', 'asignacion', 'otros')
   def __init__(self, nombre, asignacion=None):
     super().__init__()
     self.nombre = nombre          # AST_identificador
     self.asignacion = asignacion  # AST_expresion
-    self.otros = []               # [AST_declaracion_variable]
+    self.otros = VACIO            # [AST_declaracion_variable]
   def identificador_adicional(self, declaracion):
+    if self.inicio is not None:
+      self.modificado()
+    if self.otros is VACIO:
+      self.otros = []
     self.otros.append(declaracion)
   def asignar(self, expresion):
     self.asignacion = expresion
-  def __str__(self):
-    valor = "" if (self.asignacion is None) else " = " + show(self.asignacion)
-    mas = ""
+  def descripcion(self):
+    resultado = ["DeclaraciónVariable : ", Mostrar(self.nombre)]
+    if not (self.asignacion is None):
+      resultado += [" = ", Mostrar(self.asignacion)]
     for o in self.otros:
-      mas += f" {show(o.nombre)}"
+      resultado += [" ", Mostrar(o.nombre)]
       if not(o.asignacion is None):
-        mas += f" = {show(o.asignacion)}"
-    return f"DeclaraciónVariable : {show(self.nombre)}{valor}{mas}"
-  def restore(self):
-    return super().restore(f"{restore(self.nombre)}{restore(self.asignacion)}{restore(self.otros)}")
+        resultado += [" = ", Mostrar(o.asignacion)]
+    return resultado
+  def fragmentos(self):
+    return [self.nombre, self.asignacion, self.otros]
 
 class AST_invocacion(AST_expresion):
+  __slots__ = ('argumentos', 'funcion')
   def __init__(self, funcion, argumentos):
     super().__init__()
     if type(funcion) is AST_funcion_incompleta:
@@ -4011,73 +4494,83 @@ class AST_invocacion(AST_expresion):
     else:
       self.funcion = funcion                        # AST_identificador | AST_expresion_funcion
     self.argumentos = argumentos                    # AST_argumentos
-  def __str__(self):
-    args = '' if cantidad(self.argumentos) == 0 else f" con {show(self.argumentos)}"
-    return f"Invocacion : {show(self.funcion)}{args}"
-  def restore(self):
-    return super().restore(f"{restore(self.funcion)}{restore(self.argumentos)}")
+  def descripcion(self):
+    resultado = ["Invocacion : ", Mostrar(self.funcion)]
+    if cantidad(self.argumentos) != 0:
+      resultado += [" con ", Mostrar(self.argumentos)]
+    return resultado
+  def fragmentos(self):
+    return [self.funcion, self.argumentos]
 
 class AST_iteracion(AST_declaracion):
+  __slots__ = ('variable', 'rango')
   def __init__(self, variable, rango):
     super().__init__()
     self.variable = variable    # AST_identificador
     self.rango = rango          # AST_expresion
-  def __str__(self):
-    return f"Iteración : {show(self.variable)} {show(self.rango)}"
-  def restore(self):
-    return super().restore(f"{restore(self.variable)}{restore(self.rango)}")
+  def descripcion(self):
+    return ["Iteración : ", Mostrar(self.variable), " ", Mostrar(self.rango)]
+  def fragmentos(self):
+    return [self.variable, self.rango]
 
 class AST_asignacion(AST_declaracion):
+  __slots__ = ('asignable', 'valor')
   def __init__(self, asignable, valor):
     super().__init__()
     self.asignable = asignable    # AST_asignable
     self.valor = valor            # AST_expresion
-  def __str__(self):
-    return f"Asignación : {show(self.asignable)} = {show(self.valor)}"
-  def restore(self):
-    return super().restore(f"{restore(self.asignable)}{restore(self.valor)}")
+  def descripcion(self):
+    return ["Asignación : ", Mostrar(self.asignable), " = ", Mostrar(self.valor)]
+  def fragmentos(self):
+    return [self.asignable, self.valor]
 
 class AST_expresion_acceso(AST_expresion):
+  __slots__ = ('objeto', 'campo')
   def __init__(self, objeto, modificador_campo):
     super().__init__()
     self.objeto = objeto                  # AST_expresion
     self.campo = modificador_campo.campo  # AST_identificador | AST_argumentos
     self.campo.imitarEspaciosYDecoradores(modificador_campo)
-  def __str__(self):
-    return f"Acceso : {show(self.objeto)}.{show(self.campo)}"
-  def restore(self):
-    return super().restore(f"{restore(self.objeto)}{restore(self.campo)}")
+  def descripcion(self):
+    return ["Acceso : ", Mostrar(self.objeto), ".", Mostrar(self.campo)]
+  def fragmentos(self):
+    return [self.objeto, self.campo]
 
 class AST_expresion_index(AST_expresion):
+  __slots__ = ('objeto', 'indice')
   def __init__(self, objeto, modificador_indice):
     super().__init__()
     self.objeto = objeto                      # AST_expresion
     self.indice = modificador_indice.indice   # AST_expresion
     self.indice.imitarEspaciosYDecoradores(modificador_indice)
-  def __str__(self):
-    return f"Acceso : {show(self.objeto)}[{show(self.indice)}]"
-  def restore(self):
-    return super().restore(f"{restore(self.objeto)}{restore(self.indice)}")
+  def descripcion(self):
+    return ["Acceso : ", Mostrar(self.objeto), "[", Mostrar(self.indice), "]"]
+  def fragmentos(self):
+    return [self.objeto, self.indice]
 
 class AST_combinador(AST_declaracion):
+  __slots__ = ('clase', 'expresion', 'cuerpo')
   def __init__(self, clase, expresion=[]):
     super().__init__()
     self.clase = clase          # string
     self.expresion = expresion  # [AST_nodo] [[ OJO: no es una expresión porque podría ser algo como "let i=0; i++;" ]]
     self.cuerpo = []            # [AST_nodo]
   def agregar_cuerpo(self, cuerpo):
+    if self.inicio is not None:
+      self.modificado()
     if isinstance(cuerpo, AST_cuerpo):
       cuerpo.apertura(self.cierra)
-      self.cierra = []
+      self.cierra = VACIO
       self.cuerpo = cuerpo        # AST_cuerpo
     else:
       self.clausura(cuerpo)
-  def __str__(self):
-    return f"{self.clase} : {show(self.expresion)} {show(self.cuerpo)}"
-  def restore(self):
-    return super().restore(f"{restore(self.expresion)}{restore(self.cuerpo)}")
+  def descripcion(self):
+    return [self.clase, " : ", Mostrar(self.expresion), " ", Mostrar(self.cuerpo)]
+  def fragmentos(self):
+    return [self.expresion, self.cuerpo]
 
 class AST_operador(AST_expresion):
+  __slots__ = ('izq', 'op', 'der', 'other', 'parentesis')
   def __init__(self, izq, op, der, other=None): # El último es para el ternario
     super().__init__()
     self.izq = izq        # AST_expresion | None
@@ -4104,214 +4597,254 @@ class AST_operador(AST_expresion):
         self.der.clausura(c)
     else:
       self.other.clausura(c)
-  def __str__(self):
-    resultado = ""
+  def descripcion(self):
+    resultado = []
     if not (self.izq is None):
-      resultado += f" {show(self.izq)}"
-    resultado += "?" if self.op == "?:" else self.op;
+      resultado += [" ", Mostrar(self.izq)]
+    resultado.append("?" if self.op == "?:" else self.op)
     if not (self.der is None):
-      resultado += f" {show(self.der)}"
+      resultado += [" ", Mostrar(self.der)]
     if self.op == "?:" and not (self.other is None):
-      resultado += f" : {show(self.other)}"
-    return f"{resultado}"
-  def restore(self):
-    return super().restore(f"{restore(self.izq)}{restore(self.der)}{restore(self.other)}")
+      resultado += [" : ", Mostrar(self.other)]
+    return resultado
+  def fragmentos(self):
+    return [self.izq, self.der, self.other]
 
 class AST_parametros(AST_declaracion):
+  __slots__ = ('_parametros', '_parametros_previos', 'decoradoresProximoParametro', 'decoradoresFuncion')
+  parametros = ListaAlReves()
   def __init__(self, parametros, decoradores=[]):
     super().__init__()
     self.parametros = parametros            # [AST_identificador | AST_expresion_lista]
-    self.decoradoresProximoParametro = []   # [AST_decorador]
+    self.decoradoresProximoParametro = VACIO  # [AST_decorador]
     self.decoradoresFuncion = []            # [AST_decorador]
     for decorador in decoradores:           # Tengo que hacer una copia de la lista para que no quede linkeada
       self.decoradoresFuncion.append(decorador)
   def primerParametro(self, parametro):
     for decorador in self.decoradoresProximoParametro:
       parametro = aplicarModificador(parametro, decorador)
-    self.parametros.insert(0, parametro)
-    self.decoradoresProximoParametro = []
+    AST_parametros.parametros.agregarAdelante(self, parametro)
+    self.decoradoresProximoParametro = VACIO
   def agregar_decorador_parametro(self, decorador):
+    if self.inicio is not None:
+      self.modificado()
     adicionales = decorador.adicional
-    decorador.adicional = []
+    decorador.adicional = VACIO
+    if self.decoradoresProximoParametro is VACIO:
+      self.decoradoresProximoParametro = []
     self.decoradoresProximoParametro.append(decorador)
     for ad in adicionales:
       if not isinstance(ad, AST_decorador):
         fallaDebug()
       self.agregar_decorador_parametro(ad)
   def agregar_decorador_funcion(self, decorador):
+    if self.inicio is not None:
+      self.modificado()
     adicionales = decorador.adicional
-    decorador.adicional = []
+    decorador.adicional = VACIO
     self.decoradoresFuncion.append(decorador)
     for ad in adicionales:
       if not isinstance(ad, AST_decorador):
         fallaDebug()
       self.agregar_decorador_funcion(ad)
-  def __str__(self):
-    return f"Parámetros : {show(self.parametros)}"
-  def restore(self):
-    return super().restore(f"{''.join(map(restore, self.parametros))}") + f"{restore(self.decoradoresFuncion)}"
+  def descripcion(self):
+    return ["Parámetros : ", Mostrar(self.parametros)]
+  def fragmentos(self):
+    return [self.parametros]
+  def partes(self):
+    return super().partes() + [self.decoradoresFuncion]
 
 class AST_campo(AST_declaracion):
+  __slots__ = ('clave', 'valor')
   def __init__(self, clave, valor):
     super().__init__()
     self.clave = clave  # AST_identificador | AST_declaracion_funcion | ¿AST_invocacion? | AST_expresion_literal (string)
     self.valor = valor  # AST_expresion | None
-  def __str__(self):
-    valor = '' if self.valor is None else f":{show(self.valor)}"
-    return f"{show(self.clave)}{show(valor)}"
-  def restore(self):
-    return super().restore(f"{restore(self.clave)}{restore(self.valor)}")
+  def descripcion(self):
+    resultado = [Mostrar(self.clave)]
+    if not (self.valor is None):
+      resultado += [":", Mostrar(self.valor)]
+    return resultado
+  def fragmentos(self):
+    return [self.clave, self.valor]
 
 class AST_campos(AST_declaracion):
+  __slots__ = ('_lista', '_lista_previos', 'tmp')
+  lista = ListaAlReves()
   def __init__(self):
     super().__init__()
     self.lista = []  # [AST_campo]
     self.tmp = None
   def agregar_campo(self, campo):
+    if self.inicio is not None:
+      self.modificado()
     if not (self.tmp is None):
       campo.clausura(self.tmp)
       self.tmp = None
-    self.lista.insert(0, campo)
+    AST_campos.lista.agregarAdelante(self, campo)
   def cantidad(self):
-    return len(self.lista)
+    return AST_campos.lista.cantidad(self)
   def apertura(self, c):
+    if self.inicio is not None:
+      self.modificado()
     if self.cantidad() > 0:
-      self.lista[0].apertura(c)
+      AST_campos.lista.primero(self).apertura(c)
     else:
       self.tmp = c
-  def __str__(self):
-    return f"{show(self.lista)}"
-  def restore(self):
-    return super().restore(f"{restore(self.lista)}")
+  def descripcion(self):
+    return [Mostrar(self.lista)]
+  def fragmentos(self):
+    return [self.lista]
 
 class AST_argumentos(AST_modificador):
+  __slots__ = ('_lista', '_lista_previos', 'tmp')
+  lista = ListaAlReves()
   def __init__(self):
     super().__init__()
     self.lista = []  # [AST_expresion]
-    self.tmp = []
+    self.tmp = VACIO
   def agregar_argumento(self, arg):
     if len(self.tmp) > 0:
       arg.clausura(self.tmp)
-      self.tmp = []
-    self.lista.insert(0, arg)
+      self.tmp = VACIO
+    AST_argumentos.lista.agregarAdelante(self, arg)
   def apertura(self, s):
-    if len(self.lista) > 0:
-      self.lista[0].apertura(s)
+    if self.inicio is not None:
+      self.modificado()
+    if self.cantidad() > 0:
+      AST_argumentos.lista.primero(self).apertura(s)
     else:
       self.tmp = concatenar(s, self.tmp)
   def cantidad(self):
-    return len(self.lista)
-  def __str__(self):
-    return f"{show(self.lista)}"
-  def restore(self):
-    return super().restore(f"{restore(self.tmp)}{restore(self.lista)}")
+    return AST_argumentos.lista.cantidad(self)
+  def descripcion(self):
+    return [Mostrar(self.lista)]
+  def fragmentos(self):
+    return [self.tmp, self.lista]
 
 class AST_elementos(AST_modificador):
+  __slots__ = ('_lista', '_lista_previos', 'tmp')
+  lista = ListaAlReves()
   def __init__(self):
     super().__init__()
     self.lista = []  # [AST_expresion]
-    self.tmp = []
+    self.tmp = VACIO
   def agregar_elemento(self, arg):
     if len(self.tmp) > 0:
       arg.clausura(self.tmp)
-      self.tmp = []
-    self.lista.insert(0, arg)
+      self.tmp = VACIO
+    AST_elementos.lista.agregarAdelante(self, arg)
   def apertura(self, s):
-    if len(self.lista) > 0:
-      self.lista[0].apertura(s)
+    if self.inicio is not None:
+      self.modificado()
+    if self.cantidad() > 0:
+      AST_elementos.lista.primero(self).apertura(s)
     else:
       self.tmp = concatenar(s, self.tmp)
   def cantidad(self):
-    return len(self.lista)
-  def __str__(self):
-    return f"{show(self.lista)}"
-  def restore(self):
-    return super().restore(f"{restore(self.tmp)}{restore(self.lista)}")
+    return AST_elementos.lista.cantidad(self)
+  def descripcion(self):
+    return [Mostrar(self.lista)]
+  def fragmentos(self):
+    return [self.tmp, self.lista]
 
 class AST_modificador_asignacion(AST_modificador):
+  __slots__ = ('expresion',)
   def __init__(self, expresion):
     super().__init__()
     self.expresion = expresion
-  def restore(self):
-    return super().restore(f"{restore(self.expresion)}")
+  def fragmentos(self):
+    return [self.expresion]
 
 class AST_asignable(AST_declaracion):
+  __slots__ = ()
   def __init__(self):
     super().__init__()
 
 class AST_identificador(AST_asignable):
+  __slots__ = ('identificador', 'esModificador')
   def __init__(self, identificador):
     super().__init__()
     self.identificador = identificador    # String
     self.esModificador = es_identificador_sp(identificador)
-  def __str__(self):
-    return f"{self.identificador}"
-  def restore(self):
-    return super().restore(f"{self.identificador}")
+  def descripcion(self):
+    return [self.identificador]
+  def fragmentos(self):
+    return [self.identificador]
 
 class AST_identificadores(AST_asignable):
+  __slots__ = ('identificadores', 'tmp')
   def __init__(self, identificadores):
     super().__init__()
     self.identificadores = identificadores # [AST_identificador]
-    self.tmp = []
+    self.tmp = VACIO
   def agregar_decorador(self, decorador):
+    if self.inicio is not None:
+      self.modificado()
     if len(self.identificadores) > 0:
       self.identificadores[-1] = aplicarModificador(self.identificadores[-1], decorador)
     else:
+      if self.tmp is VACIO:
+        self.tmp = []
       self.tmp.append(decorador)
-  def __str__(self):
-    return f"{show(self.identificadores)}"
-  def restore(self):
-    return super().restore(f"{''.join(map(restore, self.identificadores))}")
+  def descripcion(self):
+    return [Mostrar(self.identificadores)]
+  def fragmentos(self):
+    return [self.identificadores]
 
 class AST_indexacion_clase(AST_asignable):
+  __slots__ = ('identificador',)
   def __init__(self, identificador):
     super().__init__()
     self.identificador = identificador    # AST_identificador
-  def __str__(self):
-    return f"[{show(self.identificador)}]"
-  def restore(self):
-    return super().restore(f"{restore(self.identificador)}")
+  def descripcion(self):
+    return ["[", Mostrar(self.identificador), "]"]
+  def fragmentos(self):
+    return [self.identificador]
 
 class AST_identificador_objeto(AST_asignable):
+  __slots__ = ('campos',)
   def __init__(self, campos):
     super().__init__()
     self.campos = campos        # AST_campos
-  def __str__(self):
-    return f"{show(self.campos)}"
-  def restore(self):
-    return super().restore(f"{restore(self.campos)}")
+  def descripcion(self):
+    return [Mostrar(self.campos)]
+  def fragmentos(self):
+    return [self.campos]
 
 class AST_import(AST_declaracion):
+  __slots__ = ('archivo', 'importables', 'opt_alias', 'es_tipo')
   def __init__(self, archivo, importables=None, opt_alias=[], es_tipo=False):
     super().__init__()
     self.archivo = archivo          # AST_expresion_literal
     self.importables = importables  # AST_identificador | AST_identificadores | AST_sintaxis | None
     self.opt_alias = opt_alias      # AST_identificador | [AST_skippeable]
     self.es_tipo = es_tipo          # Bool
-  def __str__(self):
-    return f"Import {show(self.archivo)}"
-  def restore(self):
-    return super().restore(f"{restore(self.importables)}{restore(self.opt_alias)}{restore(self.archivo)}")
+  def descripcion(self):
+    return ["Import ", Mostrar(self.archivo)]
+  def fragmentos(self):
+    return [self.importables, self.opt_alias, self.archivo]
 
 class AST_export(AST_declaracion):
+  __slots__ = ('exportable',)
   def __init__(self, exportable):
     super().__init__()
     # Si lo estoy exportando, no debería ser una invocación ni una expresión suelta
     if type(exportable) is AST_invocacion or type(exportable) is AST_expresion_funcion:
-      print("ERROR p_declaracion_function_decl")
-      exit(0)
+      raise ConstruccionInvalida("No se puede exportar una invocación ni una expresión suelta")
     self.exportable = exportable    # AST_declaracion_variable | AST_declaracion_funcion | AST_identificador | AST_identificadores
-  def __str__(self):
-    return f"Export {show(self.exportable)}"
-  def restore(self):
-    return super().restore(restore(self.exportable))
+  def descripcion(self):
+    return ["Export ", Mostrar(self.exportable)]
+  def fragmentos(self):
+    return [self.exportable]
 
 class AST_modificador_operador(AST_modificador):
+  __slots__ = ()
   def __init__(self):
     super().__init__()
 
 class AST_funcion_incompleta(AST_modificador):
+  __slots__ = ('parametros', 'cuerpo')
   def __init__(self, parametros, cuerpo):
     super().__init__()
     self.parametros = parametros          # AST_parametros
@@ -4324,118 +4857,136 @@ class AST_funcion_incompleta(AST_modificador):
     self.parametros.agregar_decorador_funcion(decorador)
 
 class AST_decorador(AST_modificador):
+  __slots__ = ()
   def __init__(self):
     super().__init__()
 
 class AST_decorador_tipo(AST_decorador):
+  __slots__ = ('tipo',)
   def __init__(self, tipo):
     super().__init__()
     adicionales = tipo.adicional
-    tipo.adicional = []
+    tipo.adicional = VACIO
     for m in adicionales:
       tipo = aplicarModificador(tipo, m)
     self.tipo = tipo                      # AST_tipo
-  def restore(self):
-    return super().restore(f"{restore(self.tipo)}")
+  def fragmentos(self):
+    return [self.tipo]
 
 class AST_decorador_subtipo(AST_decorador):
+  __slots__ = ('tipo',)
   def __init__(self, tipo):
     super().__init__()
     adicionales = tipo.adicional
-    tipo.adicional = []
+    tipo.adicional = VACIO
     for m in adicionales:
       tipo = aplicarModificador(tipo, m)
     self.tipo = tipo                      # AST_tupla
-  def restore(self):
-    return super().restore(f"{restore(self.tipo)}")
+  def fragmentos(self):
+    return [self.tipo]
 
 class AST_decorador_opcional(AST_decorador):
+  __slots__ = ()
   def __init__(self):
     super().__init__()
-  def restore(self):
-    return super().restore("")
+  def fragmentos(self):
+    return []
 
 class AST_decorador_default(AST_decorador):
+  __slots__ = ('default',)
   def __init__(self, default):
     super().__init__()
     self.default = default      # AST_expresion
-  def restore(self):
-    return super().restore(f"{restore(self.default)}")
+  def fragmentos(self):
+    return [self.default]
 
 class AST_decorador_alias(AST_decorador):
+  __slots__ = ('alias',)
   def __init__(self, alias):
     super().__init__()
     self.alias = alias          # AST_identificador
-  def restore(self):
-    return super().restore(f"{restore(self.alias)}")
+  def fragmentos(self):
+    return [self.alias]
 
 class AST_decorador_comotipo(AST_decorador):
+  __slots__ = ('tipo',)
   def __init__(self, tipo):
     super().__init__()
     self.tipo = tipo          # AST_tipo
-  def restore(self):
-    return super().restore(f"{restore(self.tipo)}")
+  def fragmentos(self):
+    return [self.tipo]
 
 class AST_decorador_keyword(AST_decorador):
+  __slots__ = ('identificador',)
   def __init__(self, identificador):
     super().__init__()
     self.identificador = identificador    # AST_identificador
-  def restore(self):
-    return super().restore(f"{restore(self.identificador)}")
+  def fragmentos(self):
+    return [self.identificador]
 
 class AST_decorador_implementacion(AST_decorador):
+  __slots__ = ('nombre',)
   def __init__(self, nombre):
     super().__init__()
     self.nombre = nombre          # AST_tipo | [AST_tipo]
-  def restore(self):
-    return super().restore(f"{restore(self.nombre)}")
+  def fragmentos(self):
+    return [self.nombre]
 
 class AST_decorador_extension(AST_decorador):
+  __slots__ = ('nombre',)
   def __init__(self, nombre):
     super().__init__()
     self.nombre = nombre          # AST_tipo
-  def restore(self):
-    return super().restore(f"{restore(self.nombre)}")
+  def fragmentos(self):
+    return [self.nombre]
 
 class AST_modificador_operador_binario(AST_modificador_operador):
+  __slots__ = ('clase', 'expresion')
   def __init__(self, clase, expresion):
     super().__init__()
     self.clase = clase          # string
     self.expresion = expresion  # AST_expresion
 
 class AST_modificador_operador_ternario(AST_modificador_operador):
+  __slots__ = ('expresion1', 'expresion2')
   def __init__(self, expresion1, expresion2):
     super().__init__()
     self.expresion1 = expresion1  # AST_expresion
     self.expresion2 = expresion2  # AST_expresion
 
 class AST_modificador_operador_posfijo(AST_modificador_operador):
+  __slots__ = ('clase',)
   def __init__(self, clase):
     super().__init__()
     self.clase = clase          # string
-  def restore(self):
-    return super().restore(f"{self.clase}")
+  def fragmentos(self):
+    return [self.clase]
 
 class AST_modificador_objeto(AST_modificador):
+  __slots__ = ()
   def __init__(self):
     super().__init__()
 
 class AST_modificador_objeto_acceso(AST_modificador_objeto):
+  __slots__ = ('campo',)
   def __init__(self, identificador):
     super().__init__()
     self.campo = identificador    # AST_identificador | AST_argumentos
 
 class AST_modificador_objeto_index(AST_modificador_objeto):
+  __slots__ = ('indice',)
   def __init__(self, expresion):
     super().__init__()
     self.indice = expresion       # AST_expresion
 
 class AST_iterador(AST_modificador):
+  __slots__ = ('expresion',)
   def __init__(self, expresion):
     super().__init__()
     self.expresion = expresion    # AST_expresion
 
 class AST_modificador_variable_adicional(AST_modificador):
+  __slots__ = ('declaracion',)
   def __init__(self, identificador):
     super().__init__()
     self.declaracion = AST_declaracion_variable(identificador)    # AST_declaracion_variable
@@ -4450,225 +5001,260 @@ class AST_modificador_variable_adicional(AST_modificador):
     self.declaracion.asignar(expresion)
 
 class AST_format_string(AST_expresion):
+  __slots__ = ('elementos', 'tmp')
   def __init__(self, completo):
     super().__init__()
-    # TODO: parsing auxiliar para identificar las expresiones dentro de "completo". Luego eliminar el campo self.tmp y la primera línea de la función restore
-    self.elementos = []    # [AST_expresion]
+    # TODO: parsing auxiliar para identificar las expresiones dentro de "completo". Luego eliminar el campo self.tmp y la primera línea de la función fragmentos
+    self.elementos = VACIO # [AST_expresion]
     self.tmp = completo
-  def restore(self):
-    return super().restore(f"{self.tmp}")
-    return super().restore(f"{''.join(map(restore, self.elementos))}")
+  def fragmentos(self):
+    return [self.tmp]
+    return [self.elementos]
 
 class AST_tipo(AST_modificador):
+  __slots__ = ('alias',)
   def __init__(self):
     super().__init__()
-    self.alias = []
+    self.alias = VACIO
   def nuevo_alias(self, otro):
+    if self.alias is VACIO:
+      self.alias = []
     self.alias.append(otro)
-  def restore(self,contenido=''):
-    return super().restore(f"{contenido}{restore(self.alias)}")
+  def partes(self):
+    # El alias va después del contenido, antes de los decoradores
+    partes = super().partes()
+    partes.insert(-2, self.alias)
+    return partes
 
 class AST_tipo_base(AST_tipo):
+  __slots__ = ('base',)
   def __init__(self, base):
     super().__init__()
     self.base = base                    # AST_identificador | AST_expresion_acceso | string
-  def __str__(self):
-    return f"Tipo : {show(self.base)}"
-  def restore(self):
-    return super().restore(f"{restore(self.base)}")
+  def descripcion(self):
+    return ["Tipo : ", Mostrar(self.base)]
+  def fragmentos(self):
+    return [self.base]
 
 class AST_tipo_lista(AST_tipo):
+  __slots__ = ('rec',)
   def __init__(self):
     super().__init__()
     self.rec = None
-  def __str__(self):
-    return f"Tipo : [{show(self.rec)}]"
+  def descripcion(self):
+    return ["Tipo : [", Mostrar(self.rec), "]"]
   def set_rec(self, rec):
     self.rec = rec
     self.rec.clausura(self.abre)
     self.rec.clausura(self.cierra)
     self.anularEspacios()
-  def restore(self):
-    return super().restore(f"{restore(self.rec)}")
+  def fragmentos(self):
+    return [self.rec]
 
 class AST_tipo_objeto(AST_tipo):
+  __slots__ = ('campos',)
   def __init__(self, campos):
     super().__init__()
     self.campos = campos                # AST_campos_tipo
-  def __str__(self):
-    return f"Tipo : {show(self.campos)}"
-  def restore(self):
-    return super().restore(f"{restore(self.campos)}")
+  def descripcion(self):
+    return ["Tipo : ", Mostrar(self.campos)]
+  def fragmentos(self):
+    return [self.campos]
 
 class AST_tipo_flecha(AST_tipo):
+  __slots__ = ('parametros', 'tipo_salida')
   def __init__(self, parametros, tipo_salida):
     super().__init__()
     self.parametros = parametros        # AST_parametros
     self.tipo_salida = tipo_salida      # AST_tipo
   def primerParametro(self, parametro):
     self.parametros.primerParametro(parametro)
-  def __str__(self):
-    return f"Tipo : {show(self.parametros)} => {show(self.tipo_salida)}"
-  def restore(self):
-    return super().restore(f"{restore(self.parametros)}{restore(self.tipo_salida)}")
+  def descripcion(self):
+    return ["Tipo : ", Mostrar(self.parametros), " => ", Mostrar(self.tipo_salida)]
+  def fragmentos(self):
+    return [self.parametros, self.tipo_salida]
 
 class AST_tipo_suma(AST_tipo):
+  __slots__ = ('_sub_tipos', '_sub_tipos_previos')
+  sub_tipos = ListaAlReves()
   def __init__(self, sub_tipos):
     super().__init__()
     self.sub_tipos = sub_tipos          # [AST_tipo]
   def o(self, o):
-    self.sub_tipos.insert(0, o)
+    AST_tipo_suma.sub_tipos.agregarAdelante(self, o)
   def cantidad(self):
-    return len(self.sub_tipos)
+    return AST_tipo_suma.sub_tipos.cantidad(self)
   def apertura(self, c):
     if self.cantidad() > 0:
-      self.sub_tipos[0].apertura(c)
+      AST_tipo_suma.sub_tipos.primero(self).apertura(c)
     else:
       self.clausura(c)
-  def __str__(self):
-    return f"Tipo : {' | '.join(list(map(show, self.sub_tipos)))}"
-  def restore(self):
-    return super().restore(f"{restore(self.sub_tipos)}")
+  def descripcion(self):
+    return ["Tipo : ", *mostrarSeparados(self.sub_tipos, ' | ')]
+  def fragmentos(self):
+    return [self.sub_tipos]
 
 class AST_tipo_producto(AST_tipo):
+  __slots__ = ('_sub_tipos', '_sub_tipos_previos')
+  sub_tipos = ListaAlReves()
   def __init__(self, sub_tipos):
     super().__init__()
     self.sub_tipos = sub_tipos          # [AST_tipo]
   def y(self, y):
-    self.sub_tipos.insert(0, y)
+    AST_tipo_producto.sub_tipos.agregarAdelante(self, y)
   def cantidad(self):
-    return len(self.sub_tipos)
+    return AST_tipo_producto.sub_tipos.cantidad(self)
   def apertura(self, c):
     if self.cantidad() > 0:
-      self.sub_tipos[0].apertura(c)
+      AST_tipo_producto.sub_tipos.primero(self).apertura(c)
     else:
       self.clausura(c)
-  def __str__(self):
-    return f"Tipo : {' & '.join(list(map(show, self.sub_tipos)))}"
-  def restore(self):
-    return super().restore(f"{restore(self.sub_tipos)}")
+  def descripcion(self):
+    return ["Tipo : ", *mostrarSeparados(self.sub_tipos, ' & ')]
+  def fragmentos(self):
+    return [self.sub_tipos]
 
 class AST_tipo_tupla(AST_tipo):
+  __slots__ = ('_sub_tipos', '_sub_tipos_previos')
+  sub_tipos = ListaAlReves()
   def __init__(self, sub_tipos=[]):
     super().__init__()
     self.sub_tipos = sub_tipos          # [AST_tipo]
   def fst(self, t):
-    self.sub_tipos.insert(0, t)
+    AST_tipo_tupla.sub_tipos.agregarAdelante(self, t)
   def cantidad(self):
-    return len(self.sub_tipos)
+    return AST_tipo_tupla.sub_tipos.cantidad(self)
   def apertura(self, c):
     if self.cantidad() > 0:
-      self.sub_tipos[0].apertura(c)
+      AST_tipo_tupla.sub_tipos.primero(self).apertura(c)
     else:
       self.clausura(c)
-  def __str__(self):
-    return f"Tipo : <{', '.join(list(map(show, self.sub_tipos)))}>"
-  def restore(self):
-    return super().restore(f"{restore(self.sub_tipos)}")
+  def descripcion(self):
+    return ["Tipo : <", *mostrarSeparados(self.sub_tipos, ', '), ">"]
+  def fragmentos(self):
+    return [self.sub_tipos]
 
 class AST_tipo_compuesto(AST_tipo):
+  __slots__ = ('base', 'sub_tipos')
   def __init__(self, base, sub_tipos):
     super().__init__()
     self.base = base                    # AST_tipo_base
     self.sub_tipos = sub_tipos          # AST_tupla
-  def __str__(self):
-    return f"Tipo : {self.base}<{', '.join(list(map(show, self.sub_tipos.sub_tipos)))}>"
-  def restore(self):
-    return super().restore(f"{restore(self.base)}{restore(self.sub_tipos)}")
+  def descripcion(self):
+    return ["Tipo : ", str(self.base), "<", *mostrarSeparados(self.sub_tipos.sub_tipos, ', '), ">"]
+  def fragmentos(self):
+    return [self.base, self.sub_tipos]
 
 class AST_tipo_varios(AST_tipo):
+  __slots__ = ('_sub_tipos', '_sub_tipos_previos')
+  sub_tipos = ListaAlReves()
   def __init__(self, sub_tipos):
     super().__init__()
     self.sub_tipos = sub_tipos          # [AST_tipo]
   def agregar_tipo(self, o):
-    self.sub_tipos.insert(0, o)
+    AST_tipo_varios.sub_tipos.agregarAdelante(self, o)
   def cantidad(self):
-    return len(self.sub_tipos)
+    return AST_tipo_varios.sub_tipos.cantidad(self)
   def apertura(self, c):
     if self.cantidad() > 0:
-      self.sub_tipos[0].apertura(c)
+      AST_tipo_varios.sub_tipos.primero(self).apertura(c)
     else:
       self.clausura(c)
-  def __str__(self):
-    return f"Tipo : {' , '.join(list(map(show, self.sub_tipos)))}"
-  def restore(self):
-    return super().restore(f"{restore(self.sub_tipos)}")
+  def descripcion(self):
+    return ["Tipo : ", *mostrarSeparados(self.sub_tipos, ' , ')]
+  def fragmentos(self):
+    return [self.sub_tipos]
 
 class AST_tipo_derivado(AST_tipo):
+  __slots__ = ('expresion',)
   def __init__(self, expresion):
     super().__init__()
     self.expresion = expresion        # AST_expresion
-  def __str__(self):
-    return f"El tipo de {show(self.expresion)}"
-  def restore(self):
-    return super().restore(f"{restore(self.expresion)}")
+  def descripcion(self):
+    return ["El tipo de ", Mostrar(self.expresion)]
+  def fragmentos(self):
+    return [self.expresion]
 
 class AST_tipo_void(AST_tipo):
+  __slots__ = ()
   def __init__(self):
     super().__init__()
-  def __str__(self):
-    return f"VOID"
-  def restore(self):
-    return super().restore()
+  def descripcion(self):
+    return ["VOID"]
+  def fragmentos(self):
+    return []
 
 class AST_campos_tipo(AST_declaracion):
+  __slots__ = ('_lista', '_lista_previos')
+  lista = ListaAlReves()
   def __init__(self):
     super().__init__()
     self.lista = []            # [AST_campo_tipo]
   def agregar_campo(self, campo):
-    self.lista.insert(0, campo)
+    AST_campos_tipo.lista.agregarAdelante(self, campo)
   def cantidad(self):
-    return len(self.lista)
+    return AST_campos_tipo.lista.cantidad(self)
   def apertura(self, c):
+    if self.inicio is not None:
+      self.modificado()
     if self.cantidad() > 0:
-      self.lista[0].apertura(c)
+      AST_campos_tipo.lista.primero(self).apertura(c)
     else:
       self.cierra = concatenar(c, self.cierra)
-  def __str__(self):
-    return f"{show(self.lista)}"
-  def restore(self):
-    return super().restore(f"{restore(self.lista)}")
+  def descripcion(self):
+    return [Mostrar(self.lista)]
+  def fragmentos(self):
+    return [self.lista]
 
 class AST_campo_tipo(AST_declaracion):
+  __slots__ = ('clave', 'tipo')
   def __init__(self, clave, tipo):
     super().__init__()
     self.clave = clave  # AST_identificador | AST_expresion_literal (string) | None
     self.tipo = tipo    # AST_tipo
-  def __str__(self):
-    clave = "" if (self.clave is None) else f"{show(self.clave)}:"
-    return f"{clave}{show(self.tipo)}"
-  def restore(self):
-    return super().restore(f"{restore(self.clave)}{restore(self.tipo)}")
+  def descripcion(self):
+    resultado = [] if (self.clave is None) else [Mostrar(self.clave), ":"]
+    return resultado + [Mostrar(self.tipo)]
+  def fragmentos(self):
+    return [self.clave, self.tipo]
 
 class AST_return(AST_declaracion):
+  __slots__ = ('expresion',)
   def __init__(self, expresion):
     super().__init__()
     self.expresion = expresion  # AST_expresion | [AST_skippeable]
-  def __str__(self):
-    resultado = f" {show(self.expresion)}" if isinstance(self.expresion, AST_expresion) else ""
-    return f"Return {resultado}"
-  def restore(self):
-    return super().restore(f"{restore(self.expresion)}")
+  def descripcion(self):
+    resultado = ["Return "]
+    if isinstance(self.expresion, AST_expresion):
+      resultado += [" ", Mostrar(self.expresion)]
+    return resultado
+  def fragmentos(self):
+    return [self.expresion]
 
 class AST_expresion_new(AST_expresion):
+  __slots__ = ('tipo',)
   def __init__(self, tipo):
     super().__init__()
     self.tipo = tipo      # AST_tipo
-  def __str__(self):
-    return f"New {show(self.tipo)}"
-  def restore(self):
-    return super().restore(f"{restore(self.tipo)}")
+  def descripcion(self):
+    return ["New ", Mostrar(self.tipo)]
+  def fragmentos(self):
+    return [self.tipo]
 
 class AST_programa(AST_nodo):
+  __slots__ = ('declaraciones', 'errores', 'fuente')
   def __init__(self, declaraciones):
     super().__init__()
     self.declaraciones = sanitizar(declaraciones)   # [AST_nodo]
-  def __str__(self):
-    return '\n'.join(list(map(show, self.declaraciones)))
-  def restore(self):
-    return super().restore(f"{''.join(map(restore, self.declaraciones))}")
+    self.errores = []                               # [ErrorDeSintaxis]
+    self.fuente = None                              # string (el código parseado, si se conoce)
+  def descripcion(self):
+    return mostrarSeparados(self.declaraciones, '\n')
+  def fragmentos(self):
+    return [self.declaraciones]
 
 class AST_TMP(AST_nodo):
+  __slots__ = ('identificador', 'contenido', 'rec')
   def __init__(self, identificador, contenido, rec=None):
     super().__init__()
     self.identificador = identificador
@@ -4676,11 +5262,23 @@ class AST_TMP(AST_nodo):
     self.rec = rec
 
 def aplicarModificador(nodo, mod):
+  # Después de mod se aplican sus modificadores adicionales (y los de ellos, en
+  # orden), recorriéndolos con recorrer para no anidar llamadas en cadenas largas
+  resultado = nodo
+  def aplicar(mod):
+    nonlocal resultado
+    adicionales = []
+    if isinstance(mod, AST_modificador):
+      adicionales = mod.adicional
+      mod.adicional = VACIO
+    resultado = aplicarUnModificador(resultado, mod)
+    return adicionales
+  # mod puede ser una lista de skippeables, que se aplica toda junta
+  recorrer(aplicar(mod), aplicar, None)
+  return resultado
+
+def aplicarUnModificador(nodo, mod):
   resultado = nodo
-  adicionales = []
-  if isinstance(mod, AST_modificador):
-    adicionales = mod.adicional
-    mod.adicional = []
   if type(mod) is AST_modificador_objeto_acceso:
     if isinstance(nodo, AST_tipo):
       # TIPO {nodo}.{mod}
@@ -4760,8 +5358,6 @@ def aplicarModificador(nodo, mod):
       # ERROR
       fallaDebug()
     resultado.clausura(mod)
-  for ad in adicionales:
-    resultado = aplicarModificador(resultado, ad)
   return resultado
 
 def parametrosDesdeNodo(nodo):
@@ -4776,14 +5372,13 @@ def parametrosDesdeNodo(nodo):
   elif type(nodo) is AST_expresion_lista:
     lista = nodo
     decoradores = lista.decoradores
-    lista.decoradores = []
+    lista.decoradores = VACIO
     lista = [lista]
     parametros = AST_parametros(lista, decoradores)
   elif isinstance(nodo, AST_parametros):
     parametros = nodo
   elif isinstance(nodo, AST_nodo):
-    print(f"ERROR : no se puede usar un tipo {type(nodo)} como parámetros de una función anónima")
-    exit(0)
+    raise ConstruccionInvalida(f"No se puede usar un {type(nodo).__name__} como parámetros de una función anónima")
   return parametros
 
 def tipoDesdeNodo(nodo):
@@ -4812,7 +5407,7 @@ def tipoDesdeNodo(nodo):
 
 def crearDeclaracionFuncion(nombre, funcion_incompleta):
   adicionales = funcion_incompleta.adicional
-  funcion_incompleta.adicional = []
+  funcion_incompleta.adicional = VACIO
   declaracion = AST_declaracion_funcion(nombre, funcion_incompleta)
   for ad in adicionales:
     declaracion = aplicarModificador(declaracion, ad)
@@ -4820,7 +5415,7 @@ def crearDeclaracionFuncion(nombre, funcion_incompleta):
 
 def crearExpresionFuncion(funcion_incompleta):
   adicionales = funcion_incompleta.adicional
-  funcion_incompleta.adicional = []
+  funcion_incompleta.adicional = VACIO
   expresion = AST_expresion_funcion(funcion_incompleta)
   for ad in adicionales:
     expresion = aplicarModificador(expresion, ad)
@@ -4831,29 +5426,308 @@ def cantidad(x):
     return len(x)
   return x.cantidad()
 
-def show(x):
+def recorrer(raiz, expandir, visitar):
+  # Motor de todos los recorridos del AST (restore, show, str y
+  # aplicarModificador). Recorre en profundidad y en orden con una pila
+  # explícita en lugar de recursión, así no hay límite de profundidad.
+  # Los strings son hojas y las listas (o VACIO) se recorren en orden;
+  # cualquier otra cosa la descompone expandir(x), que devuelve sus partes o
+  # None si x es una hoja. Cada hoja se le pasa a visitar.
+  pendientes = [raiz]
+  pop = pendientes.pop
+  extend = pendientes.extend
+  while pendientes:
+    x = pop()
+    if type(x) is str:
+      visitar(x)
+    elif type(x) is list:
+      if x:
+        extend(reversed(x))
+    elif x is VACIO:
+      pass
+    else:
+      partes = expandir(x)
+      if partes is None:
+        visitar(x)
+      else:
+        extend(reversed(partes))
+
+class Mostrar:
+  # En la descripción de un nodo, x se muestra con show
+  __slots__ = ('x',)
+  def __init__(self, x):
+    self.x = x
+
+def mostrarSeparados(lista, separador):
+  resultado = []
+  for x in lista:
+    if len(resultado) > 0:
+      resultado.append(separador)
+    resultado.append(Mostrar(x))
+  return resultado
+
+def partesShow(mostrar):
+  # En las descripciones, lo que no es string es un Mostrar
+  x = mostrar.x
+  if isinstance(x, AST_nodo):
+    return x.descripcion()
   if x is None:
-    return ''
-  if type(x) == type([]):
-    return f"[{' '.join(list(map(show,x)))}]"
-  return str(x).replace('\n','\\n').replace('\t','\\t').replace('\r','\\r')
+    return []
+  if type(x) == type([]) or x is VACIO:
+    return ['[', *mostrarSeparados(x, ' '), ']']
+  return [str(x)]
+
+def show(x):
+  # Todo lo que hay adentro de un show se escapa, así que alcanza con escapar
+  # una vez el texto completo
+  partes = []
+  recorrer(Mostrar(x), partesShow, partes.append)
+  return ''.join(partes).replace('\n','\\n').replace('\t','\\t').replace('\r','\\r')
 
-def restore(x):
+def partesRestore(x):
   if x is None:
-    return ''
-  if type(x) == type(''):
-    return x
-  if type(x) == type([]):
-    return ''.join(list(map(restore,x)))
-  return x.restore()
+    return []
+  return x.partes()
+
+def restore(x, fuente=None):
+  partes = []
+  restore_into(x, partes.append, fuente)
+  return ''.join(partes)
+
+def restore_into(x, escribir, fuente=None):
+  # Recorre x una sola vez pasándole a escribir (por ejemplo list.append o
+  # io.StringIO.write) cada pedazo de código en orden. Así restore es lineal en
+  # el tamaño del código en lugar de copiar el texto en cada nivel del árbol.
+  # Si se pasa el código fuente, los nodos con posición se copian directamente
+  # de ahí sin recorrerlos, salvo que desde que se les asignó se haya modificado
+  # algún nodo (ver AST_nodo.modificado y olvidarPosiciones).
+  if fuente is None:
+    recorrer(x, partesRestore, escribir)
+    return
+  def expandir(x):
+    if x is None:
+      return []
+    if x.inicio is None or not x.posiciones.vigentes:
+      return x.partes()
+    return [fuente[x.inicio:x.fin]]
+  recorrer(x, expandir, escribir)
+
+# POSICIONES ########################################################################################
+''' Cada nodo guarda en inicio y fin (span) el rango del código fuente que le corresponde, en las
+    mismas unidades que lexpos: fuente[nodo.inicio:nodo.fin] == nodo.restore(). No se arman durante
+    el parseo, porque los skippeables pasan de un nodo a otro hasta el final: se asignan después
+    con un recorrido como el de restore.
+''' #################################################################################################
+def asignarPosiciones(raiz, inicio=0):
+  # Devuelve dónde termina raiz
+  posicion = inicio
+  posiciones = Posiciones()
+  def expandir(x):
+    if x is None:
+      return []
+    if type(x) is tuple: # (nodo,): se terminó de recorrer el nodo
+      x[0].fin = posicion
+      return []
+    x.inicio = posicion
+    x.posiciones = posiciones
+    return [*x.partes(), (x,)]
+  def avanzar(texto):
+    nonlocal posicion
+    posicion += len(texto)
+  recorrer(raiz, expandir, avanzar)
+  return posicion
+
+def hijos(nodo):
+  # Los nodos que aparecen directamente en las partes de nodo, en orden
+  resultado = []
+  def expandir(x):
+    if x is None:
+      return []
+    if x is nodo:
+      return x.partes()
+    resultado.append(x)
+    return []
+  recorrer(nodo, expandir, lambda texto: None)
+  return resultado
 
-def fallaDebug():
-  breakpoint()
+def nodos(raiz):
+  # Todos los nodos de raiz (incluida), en orden
+  resultado = []
+  def expandir(x):
+    if x is None:
+      return []
+    resultado.append(x)
+    return x.partes()
+  recorrer(raiz, expandir, lambda texto: None)
+  return resultado
 
-parser = yacc()
+def nodoEnPosicion(raiz, posicion):
+  # El nodo más profundo de raiz cuyo código incluye la posición, o None
+  if raiz.inicio is None or not (raiz.inicio <= posicion < raiz.fin):
+    return None
+  resultado = raiz
+  while True:
+    siguiente = None
+    for hijo in hijos(resultado):
+      if hijo.inicio is not None and hijo.inicio <= posicion < hijo.fin:
+        siguiente = hijo
+        break
+    if siguiente is None:
+      return resultado
+    resultado = siguiente
+
+def contiene(nodo, otro):
+  return nodo.inicio is not None and otro.inicio is not None and nodo.inicio <= otro.inicio and otro.fin <= nodo.fin
+
+def olvidarPosiciones(raiz, nodo):
+  # Los métodos que modifican nodos ya invalidan las posiciones (ver
+  # AST_nodo.modificado); esto es para cuando se le asigna un campo a nodo
+  # directamente: olvida su posición y la de los nodos que lo contienen, para
+  # que restore con el código fuente no copie el texto viejo.
+  # El camino desde raiz se busca por posiciones; si no se encuentra (por
+  # ejemplo entre nodos vacíos en la misma posición) se revisan todos.
+  camino = [raiz]
+  while camino[-1] is not nodo:
+    siguiente = None
+    for hijo in hijos(camino[-1]):
+      if hijo is nodo or contiene(hijo, nodo):
+        siguiente = hijo
+        break
+    if siguiente is None:
+      camino = [x for x in nodos(raiz) if contiene(x, nodo)]
+      break
+    camino.append(siguiente)
+  for x in camino + [nodo]:
+    x.inicio = None
+    x.fin = None
 
-def parsear(contenido):
-  return parser.parse(contenido, lex())
+def fallaDebug():
+  # Se llega acá con combinaciones de nodos que la gramática acepta pero que el
+  # armado del AST no contempla
+  raise ConstruccionInvalida("Combinación de nodos inesperada")
+
+# El parser se construye recién la primera vez que se necesita, así quien sólo
+# usa el lexer o las clases del AST no paga la construcción de las tablas LALR.
+# Las tablas se congelan en el módulo generado parsetab.py (ver yacc.write_table),
+# que además expone un parser listo: `from parsetab import parser` evita incluso
+# la validación de la gramática. Si las tablas están al día, obtenerParser
+# devuelve ese mismo parser en lugar de armar otro.
+_parser = None
+
+def obtenerParser():
+  global _parser
+  if _parser is None:
+    _parser = yacc(tabmodule='parsetab')
+  return _parser
+
+def warm_up():
+  # Para servidores que prefieren pagar la construcción del parser al arrancar
+  obtenerParser()
+
+def __getattr__(nombre):
+  # Compatibilidad con quienes usaban directamente parser.parser
+  if nombre == 'parser':
+    return obtenerParser()
+  raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
+
+def parsear(contenido, recuperar=False):
+  # contenido puede ser el código fuente o los tokens que ya generó tokenizar
+  # (una lista o cualquier iterador), así no hace falta volver a tokenizar.
+  # Con recuperar=True un error de sintaxis no corta el parseo: el programa
+  # queda con nodos AST_error para lo salteado y los errores en .errores
+  # Todos los nodos quedan con su span y el código (el de los tokens, si se
+  # pasaron tokens) en programa.fuente: restore(programa, programa.fuente)
+  # sólo copia texto.
+  tokens = None
+  if not isinstance(contenido, str):
+    tokens = list(contenido)
+    contenido = ''.join(t.value for t in tokens)
+  parser = obtenerParser()
+  try:
+    if tokens is None:
+      programa = parser.parse(contenido, nuevoLexer())
+    else:
+      programa = parser.parse(None, ListLexer(tokens))
+    programa.fuente = contenido
+    asignarPosiciones(programa)
+    return programa
+  except ErrorDeSintaxis:
+    if not recuperar:
+      raise
+  except ConstruccionInvalida as error:
+    error.ubicar(parser)
+    raise
+  return parsearConRecuperacion(contenido)
+
+def iter_declaraciones(contenido):
+  # Como parsear (sin recuperación de errores), pero devuelve un iterador que
+  # entrega cada declaración del nivel superior apenas se reduce, sin esperar
+  # al resto del archivo ni guardarlas en un AST_programa. Los skippeables del
+  # principio del archivo salen antes que la primera declaración, así que
+  # concatenando el restore de todo lo entregado se obtiene el archivo.
+  # Un error de sintaxis se levanta al llegar a él, después de haber entregado
+  # las declaraciones anteriores. Los spans de lo entregado son posiciones en
+  # el archivo completo.
+  if isinstance(contenido, str):
+    lexer = nuevoLexer()
+    lexer.input(contenido)
+  else:
+    lexer = ListLexer(contenido)
+  lexer.salida = [] # Donde p_programa_principal_* dejan lo que se entrega
+  parser = obtenerParser()
+  return conPosiciones(parser.parseincremental(lexer.salida, None, lexer), parser)
+
+def conPosiciones(declaraciones, parser):
+  posicion = 0
+  try:
+    for x in declaraciones:
+      posicion = asignarPosiciones(x, posicion)
+      yield x
+  except ConstruccionInvalida as error:
+    error.ubicar(parser)
+    raise
+
+class LexerRecuperacion:
+  # Lexer para parsear con recuperación de errores. Además de los tokens expone
+  # el código fuente y dónde empieza el último token entregado (el lookahead del
+  # parser), que es donde termina lo salteado por un error al final de un bloque
+  def __init__(self, contenido):
+    self.lexer = nuevoLexer()
+    self.lexer.input(contenido)
+    self.lexdata = contenido
+    self.inicioLookahead = 0
+    self.errores = [] # Donde p_error anota los errores
+  def token(self):
+    t = self.lexer.token()
+    self.inicioLookahead = len(self.lexdata) if t is None else t.lexpos
+    return t
+  @property
+  def lineno(self):
+    return self.lexer.lineno
+  @property
+  def colno(self):
+    return self.lexer.colno
+  @property
+  def lexpos(self):
+    return self.lexer.lexpos
+
+def parsearConRecuperacion(contenido):
+  # El primer intento (sin tracking, que es más rápido) falló. Se vuelve a
+  # parsear con tracking, que da la posición de lo que se saltea, y anotando
+  # los errores en lugar de cortar en el primero.
+  lexer = LexerRecuperacion(contenido)
+  parser = obtenerParser()
+  try:
+    programa = parser.parse(None, lexer, tracking=True)
+  except ConstruccionInvalida as error:
+    error.ubicar(parser)
+    raise
+  if programa is None: # No se pudo recuperar
+    raise lexer.errores[0]
+  programa.errores = lexer.errores
+  programa.fuente = contenido
+  asignarPosiciones(programa)
+  return programa
 
 def mostrarTokens(tokens):
   for t in tokens:
@@ -4934,5 +5808,6 @@ def sanitizar(declaraciones):
   return resultado
 
 def logParser():
+  parser = obtenerParser()
   print(parser.statestack)
   print(parser.symstack)
\ No newline at end of file
@@ -1,5 +1,7 @@
 import sys
 from parser import tokenizar, parsear, mostrarAST, mostrarTokens, mostrarDiff
+from parser import obtenerParser, nuevoLexer, show, iter_declaraciones, tokenizar_columnar
+from parser import restore as restoreNodo, nodos, nodoEnPosicion, ParseError, ListaAlReves
 from parser import token as t
 from parser import AST_espacios as espacios
 from parser import AST_salto as salto
@@ -23,6 +25,7 @@ from parser import AST_return as ret
 from parser import AST_combinador
 from parser import AST_cuerpo
 from parser import AST_parametros
+from parser import AST_error as error
 
 def id(s,i,c,f):
   return t('IDENTIFICADOR',s,i,c,f)
@@ -172,6 +175,16 @@ casos_de_test = [
       asignacion('x',"'2'"),
       asignacion('x','"true"')
   ]),
+  Test("String de varias líneas",
+    "x='a\\\nb';y",[
+    id('x',1,1,0),
+    t('ASIGNACION1','=',1,2,1),
+    t('STRING',"'a\\\nb'",1,3,2),
+    t('PUNTO_Y_COMA',';',2,3,8),
+    id('y',2,4,9)
+  ], [asignacion('x',"'a\\\nb'"),
+      identificador('y')
+  ]),
   Test("Declaración de función (1)",
     "function HOLA() {x=2.5;let y = .66\t;};",[
     t('DECL_FUNC','function',1,1,0),
@@ -548,6 +561,68 @@ casos_de_test = [
     t('PUNTO_Y_COMA',';',1,12,11)
   ],[
     variables([variable('x','1'),variable('y','z')])
+  ]),
+  Test("Recuperación de errores",
+  "a = ;\nb();",[
+    id('a',1,1,0),
+    t('ESPACIO',' ',1,2,1),
+    t('ASIGNACION1','=',1,3,2),
+    t('ESPACIO',' ',1,4,3),
+    t('PUNTO_Y_COMA',';',1,5,4),
+    t('SALTO','\n',1,6,5),
+    id('b',2,1,6),
+    t('ABRE_PAREN','(',2,2,7),
+    t('CIERRA_PAREN',')',2,3,8),
+    t('PUNTO_Y_COMA',';',2,4,9)
+  ],[
+    identificador('a'),
+    error('= ;\n'),
+    invocacion('b')
+  ]),
+  Test("Recuperación de errores en el primer token",
+  ") a();\nb()",[
+    t('CIERRA_PAREN',')',1,1,0),
+    t('ESPACIO',' ',1,2,1),
+    id('a',1,3,2),
+    t('ABRE_PAREN','(',1,4,3),
+    t('CIERRA_PAREN',')',1,5,4),
+    t('PUNTO_Y_COMA',';',1,6,5),
+    t('SALTO','\n',1,7,6),
+    id('b',2,1,7),
+    t('ABRE_PAREN','(',2,2,8),
+    t('CIERRA_PAREN',')',2,3,9)
+  ],[
+    error(') '),
+    invocacion('a'),
+    invocacion('b')
+  ]),
+  Test("Recuperación de errores en el primer token (separador)",
+  ";x",[
+    t('PUNTO_Y_COMA',';',1,1,0),
+    id('x',1,2,1)
+  ],[
+    error(';'),
+    identificador('x')
+  ]),
+  Test("Recuperación de un caracter inválido",
+  "x = 1;\n@",[
+    id('x',1,1,0),
+    t('ESPACIO',' ',1,2,1),
+    t('ASIGNACION1','=',1,3,2),
+    t('ESPACIO',' ',1,4,3),
+    n('1',1,5,4),
+    t('PUNTO_Y_COMA',';',1,6,5),
+    t('SALTO','\n',1,7,6),
+    t('error','@',2,1,7)
+  ],[
+    asignacion('x','1'),
+    error('@')
+  ]),
+  Test("Recuperación de errores en el único token",
+  "}",[
+    t('CIERRA_LLAVE','}',1,1,0)
+  ],[
+    error('}')
   ])
 ]
 
@@ -569,7 +644,14 @@ def evaluar(test):
     print("Error en test: "+test.desc)
     print("Faltó generar " + str(len(esperado)-i) + " tokens")
     return True
-  restore = "".join(list(map(lambda x : x.value, obtenido)))
+  # Los mismos tokens en columnas: cada valor sale de la fuente, así que la
+  # entrada se recupera si los tokens la cubren entera, sin huecos ni solapamientos
+  columnas = tokenizar_columnar(test.input)
+  if [(columnas.tipo(i), columnas.valor(i), columnas.inicios[i]) for i in range(len(columnas))] != [(x.type, x.value, x.lexpos) for x in obtenido]:
+    print("Error en test: "+test.desc)
+    print("tokenizar_columnar no generó los mismos tokens que tokenizar")
+    return True
+  restore = "".join(columnas.valores())
   if restore != test.input:
     print("Error en test: "+test.desc)
     print("La entrada original era:")
@@ -578,7 +660,28 @@ def evaluar(test):
     print(clean_str(restore))
     return True
   esperado = test.ast
-  obtenido = parsear(test.input)
+  obtenido = parsear(obtenido, recuperar=True) # Los tokens ya generados, sin volver a tokenizar
+  # El motor general (con soporte para debug y tracking) tiene que dar el mismo
+  # AST que el motor rápido que usa parsear (si no hubo que recuperarse de errores)
+  general = obtenido if len(obtenido.errores) > 0 else obtenerParser().parsedebug(test.input, nuevoLexer())
+  if show(general) != show(obtenido):
+    print("Error en test: "+test.desc)
+    print(f"El motor general generó:\n{show(general)}\n pero el rápido:\n{show(obtenido)}")
+    return True
+  # Sin asignarle posiciones (como en general), leer una lista armada al revés
+  # (ver ListaAlReves) tiene que devolver siempre la misma lista, no una copia
+  for nodo in nodos(general):
+    for nombre, campo in vars(type(nodo)).items():
+      if isinstance(campo, ListaAlReves) and getattr(nodo, nombre) is not getattr(nodo, nombre):
+        print("Error en test: "+test.desc)
+        print(f"Leer {type(nodo).__name__}.{nombre} devolvió una copia de la lista")
+        return True
+  # Entregando las declaraciones de a una se tienen que obtener las mismas
+  incremental = obtenido.declaraciones if len(obtenido.errores) > 0 else list(iter_declaraciones(test.input))
+  if list(map(show, incremental)) != list(map(show, obtenido.declaraciones)):
+    print("Error en test: "+test.desc)
+    print(f"iter_declaraciones generó:\n{clean_str(list(map(show, incremental)))}")
+    return True
   elementos_obtenidos = obtenido.declaraciones
   i = 0
   while i < len(esperado) and i < len(elementos_obtenidos):
@@ -595,6 +698,22 @@ def evaluar(test):
     print("Error en test: "+test.desc)
     print("Faltó generar " + str(len(esperado)-i) + " términos")
     return True
+  # El código salteado al recuperarse de un error tiene que estar reportado
+  if any(type(x) is error for x in elementos_obtenidos) and len(obtenido.errores) == 0:
+    print("Error en test: "+test.desc)
+    print("Se salteó código sin reportar el error de sintaxis")
+    return True
+  # Sin recuperación (con el motor rápido) el primer error se reporta en la misma posición
+  if len(obtenido.errores) > 0:
+    try:
+      parsear(test.input)
+      sinRecuperar = None
+    except ParseError as e:
+      sinRecuperar = e
+    if sinRecuperar is None or (sinRecuperar.linea, sinRecuperar.columna) != (obtenido.errores[0].linea, obtenido.errores[0].columna):
+      print("Error en test: "+test.desc)
+      print(f"Sin recuperación se reportó {sinRecuperar} en lugar de {obtenido.errores[0]}")
+      return True
   restore = obtenido.restore()
   if restore != test.input:
     print("Error en test: "+test.desc)
@@ -603,6 +722,37 @@ def evaluar(test):
     print("Pero el resultado recuperado del ast es:")
     print(clean_str(restore))
     return True
+  # Cada nodo (también los entregados por iter_declaraciones) tiene que abarcar
+  # exactamente su código, y nodoEnPosicion encontrar el más profundo
+  for nodo in nodos([obtenido, incremental]):
+    if test.input[nodo.inicio:nodo.fin] != nodo.restore():
+      print("Error en test: "+test.desc)
+      print(f"El span {nodo.span} no corresponde al nodo:\n{clean_str(nodo.restore())}")
+      return True
+  for posicion in range(len(test.input)):
+    nodo = nodoEnPosicion(obtenido, posicion)
+    if not (nodo.inicio <= posicion < nodo.fin):
+      print("Error en test: "+test.desc)
+      print(f"nodoEnPosicion({posicion}) devolvió un nodo con span {nodo.span}")
+      return True
+  if obtenido.fuente != test.input or restoreNodo(obtenido, obtenido.fuente) != test.input:
+    print("Error en test: "+test.desc)
+    print("El restore copiando del código fuente no coincide con la entrada")
+    return True
+  # Después de modificar un nodo el restore copiando del código fuente no puede
+  # devolver el código viejo
+  otro = parsear(test.input, recuperar=True)
+  nodos(obtenido)[-1].apertura(espacios('  '))
+  if restoreNodo(obtenido, obtenido.fuente) != obtenido.restore() or obtenido.restore() == test.input:
+    print("Error en test: "+test.desc)
+    print("El restore copiando del código fuente no refleja la modificación del AST")
+    return True
+  # Pero en otro árbol sin modificar se sigue copiando del código fuente (que acá
+  # se cambia para ver que se copió de ahí en lugar de recorrer los nodos)
+  if restoreNodo(otro, otro.fuente.swapcase()) != otro.fuente.swapcase():
+    print("Error en test: "+test.desc)
+    print("Modificar un AST invalidó las posiciones de otro")
+    return True
   return False
 
 def clean_str(s):